@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Book search latency against a large synthetic catalog
+
+    python -m benchmarks.book_search --books 200000
+
+Compares the ranked search (Postgres full-text/trigram indexes, or the
+in-process inverted index elsewhere) with a plain LIKE '%q%' scan
+sorted by title, which like the ranked search has to look at every match.
+"""
+import argparse
+import datetime
+import random
+
+from .common import make_app, summarize, time_calls
+
+
+WORDS = [
+    "garden", "history", "river", "silent", "winter", "kingdom", "shadow", "ocean", "mountain",
+    "secret", "journey", "forest", "empire", "letters", "island", "memory", "storm", "glass",
+    "golden", "night", "house", "road", "city", "fire", "stone", "light", "dream", "war",
+]
+
+
+def seed_catalog(db, books):
+    from src.models.BookModel import BookModel
+
+    now = datetime.datetime.utcnow()
+    rows = []
+    for i in range(books):
+        title = " ".join(random.sample(WORDS, 3)).title()
+        rows.append({"isbn": f"978-{i % 50000:05d}-{i % 97:02d}", "title": f"{title} {i}",
+                     "location": "B-1", "created_at": now, "modified_at": now})
+        if len(rows) == 10000:
+            db.session.bulk_insert_mappings(BookModel, rows)
+            rows = []
+    db.session.bulk_insert_mappings(BookModel, rows)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///bench_book_search.db")
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    from src.models import db
+    from src.models.BookModel import BookModel
+    from src.services.SearchService import search_books, search_index
+
+    with app.app_context():
+        seed_catalog(db, args.books)
+        search_index.invalidate()
+        queries = [random.choice(WORDS)[:random.randint(3, 6)] for _ in range(args.queries)]
+
+        def like_scan():
+            query = random.choice(queries)
+            BookModel.query.filter(BookModel.title.ilike(f"%{query}%")) \
+                     .order_by(BookModel.title).limit(args.limit).all()
+
+        # the first in-process search builds the index, report it separately
+        build = time_calls(lambda: search_books(queries[0], args.limit), 1)[0]
+        ranked = summarize(time_calls(lambda: search_books(random.choice(queries), args.limit), args.queries))
+        scan = summarize(time_calls(like_scan, args.queries))
+
+    print(f"catalog: {args.books} books, first search {build:.1f} ms")
+    print(f"{'method':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in (("ranked", ranked), ("like scan", scan)):
+        print(f"{name:>12} {stats['p50']:>8.3f} {stats['p95']:>8.3f} {stats['p99']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
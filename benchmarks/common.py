@@ -0,0 +1,40 @@
+import os
+import statistics
+import time
+
+
+def make_app(database_url):
+    """Create a testing app bound to database_url with a fresh schema"""
+
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+    os.environ["DATABASE_TEST_URL"] = database_url
+
+    from src.app import create_app, db
+
+    app = create_app("testing")
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def time_calls(func, repeat):
+    """Call func repeat times and return the timings in milliseconds"""
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(timings):
+    """Median and 95th/99th percentile of a list of timings"""
+
+    ordered = sorted(timings)
+    return {
+        "p50": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+    }
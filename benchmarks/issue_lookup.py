@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Lookup time of BookIssueModel.is_book_issued versus issue history size
+
+    python -m benchmarks.issue_lookup --sizes 1000 10000 100000
+
+Each size is measured with the partial index on issues(book_id) WHERE
+is_active and without any index on issues, the plan of the lookup query
+being checked on SQLite.
+"""
+import argparse
+import datetime
+import random
+
+from .common import make_app, summarize, time_calls
+
+
+BOOKS = 1000
+
+
+def seed_history(db, size):
+    from src.models.BookModel import BookModel, BookIssueModel
+    from src.models.UserModel import UserModel
+
+    now = datetime.datetime.utcnow()
+    db.session.query(BookIssueModel).delete()
+    if not BookModel.query.count():
+        db.session.bulk_insert_mappings(UserModel, [{
+            "name": "Patron", "email": "patron@bench.test", "password": "-",
+            "token_version": 0, "created_at": now, "modified_at": now,
+        }])
+        db.session.bulk_insert_mappings(BookModel, [
+            {"isbn": f"isbn-{i % 100}", "title": f"Book {i}", "location": "B-1",
+             "created_at": now, "modified_at": now}
+            for i in range(BOOKS)
+        ])
+    patron_id = UserModel.query.first().id
+    book_ids = [book_id for (book_id,) in db.session.query(BookModel.id)]
+    db.session.bulk_insert_mappings(BookIssueModel, [
+        {"book_id": random.choice(book_ids), "patron_id": patron_id, "is_active": False,
+         "due_date": now, "created_at": now, "modified_at": now}
+        for _ in range(size)
+    ])
+    # every tenth book is currently out
+    db.session.bulk_insert_mappings(BookIssueModel, [
+        {"book_id": book_id, "patron_id": patron_id, "is_active": True,
+         "due_date": now, "created_at": now, "modified_at": now}
+        for book_id in book_ids[::10]
+    ])
+    db.session.commit()
+    return book_ids
+
+
+def lookup_plan(db, book_id):
+    """SQLite query plan of the is_book_issued lookup, None on other databases"""
+
+    from src.models.BookModel import BookIssueModel
+
+    if db.engine.dialect.name != "sqlite":
+        return None
+    query = BookIssueModel.query.filter(BookIssueModel.is_active == True) \
+        .filter(BookIssueModel.book_id == book_id).limit(1)
+    sql = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    return " / ".join(row[-1] for row in db.session.execute(f"EXPLAIN QUERY PLAN {sql}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///bench_issue_lookup.db")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    from src.models import db
+    from src.models.BookModel import BookIssueModel
+
+    # the other indexes on issues (book_id, is_active) also serve the lookup
+    indexes = [index for index in BookIssueModel.__table__.indexes if index.name != "ix_issues_active_book_id"]
+    partial = next(index for index in BookIssueModel.__table__.indexes if index.name == "ix_issues_active_book_id")
+
+    print(f"{'history':>10} {'index':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  plan")
+    with app.app_context():
+        for size in args.sizes:
+            book_ids = seed_history(db, size)
+            for index in indexes:
+                index.drop(db.engine)
+            for indexed in (True, False):
+                if not indexed:
+                    db.session.remove()
+                    partial.drop(db.engine)
+                plan = lookup_plan(db, book_ids[0])
+                if plan is not None and ("ix_issues_active_book_id" in plan) != indexed:
+                    raise SystemExit(f"unexpected plan {'with' if indexed else 'without'} the index: {plan}")
+                timings = time_calls(lambda: BookIssueModel.is_book_issued(random.choice(book_ids)), args.lookups)
+                stats = summarize(timings)
+                print(f"{size:>10} {'yes' if indexed else 'no':>6} "
+                      f"{stats['p50']:>8.3f} {stats['p95']:>8.3f} {stats['p99']:>8.3f}  {plan or '-'}")
+            for index in [partial] + indexes:
+                index.create(db.engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""API throughput and latency against a seeded synthetic library
+
+    python -m benchmarks.load --books 50000 --isbns 10000 --patrons 5000 --issues 200000
+
+Drives login, catalog listing, checkout and patron search through the
+Flask test client and through a threaded WSGI server over HTTP, then
+reports req/s, p50/p95/p99 and queries per request (from the
+Server-Timing header) and saves the results as JSON for comparing runs.
+Passwords are hashed at the production bcrypt cost unless --bcrypt-rounds
+says otherwise, so login reflects what production pays.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .common import make_app, summarize
+
+
+SCENARIOS = ("login", "catalog", "checkout", "patron_search")
+
+FIRST_NAMES = ["Anna", "Ben", "Carl", "Dora", "Eva", "Fred", "Gina", "Hugo", "Iris", "Jack", "Kate", "Liam"]
+LAST_NAMES = ["Smith", "Tamm", "Saar", "Parker", "Mets", "Jones", "Kask", "Brown", "Rebane", "Miller"]
+PASSWORD = "benchmark-password"
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def _insert(db, model, rows, chunk_size=10000):
+    for start in range(0, len(rows), chunk_size):
+        db.session.bulk_insert_mappings(model, rows[start:start + chunk_size])
+
+
+def seed_library(db, books, isbns, patrons, issues):
+    """Insert staff, patrons, books over isbns ISBNs and an inactive issue history"""
+
+    from src.models.BookModel import BookModel, BookIssueModel
+    from src.models.UserModel import UserModel, Role, UserRoles
+    from src.services.IssueService import refresh_loan_counts
+    from src.shared.Seed import seed_database
+
+    seed_database()
+    now = datetime.datetime.utcnow()
+    added = now - datetime.timedelta(days=365)
+    password = UserModel.hash_password(PASSWORD)
+
+    users = [("Admin", "Bench Admin", "admin@bench.test"), ("Librarian", "Bench Librarian", "librarian@bench.test")]
+    users += [("Patron", f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}", f"patron{i}@bench.test")
+              for i in range(patrons)]
+    _insert(db, UserModel, [{"name": name, "email": email, "password": password, "token_version": 0,
+                             "created_at": now, "modified_at": now} for _, name, email in users])
+    role_ids = {name: role_id for role_id, name in db.session.query(Role.id, Role.name)}
+    user_ids = dict(db.session.query(UserModel.email, UserModel.id))
+    _insert(db, UserRoles, [{"user_id": user_ids[email], "role_id": role_ids[role]} for role, _, email in users])
+
+    _insert(db, BookModel, [{"isbn": f"978-{i % isbns:07d}", "title": f"Book {i}", "location": f"R-{i % 100}",
+                             "created_at": added, "modified_at": added} for i in range(books)])
+    book_ids = [book_id for (book_id,) in db.session.query(BookModel.id)]
+    patron_ids = [user_ids[email] for role, _, email in users if role == "Patron"]
+
+    history = []
+    for _ in range(issues):
+        issued = added + datetime.timedelta(days=random.randint(0, 300))
+        history.append({"is_active": False, "book_id": random.choice(book_ids), "patron_id": random.choice(patron_ids),
+                        "due_date": issued + datetime.timedelta(days=28), "created_at": issued, "modified_at": issued})
+    _insert(db, BookIssueModel, history)
+    db.session.commit()
+    refresh_loan_counts()
+    return book_ids, patron_ids
+
+
+def build_requests(scenario, count, tokens, free_books, patron_ids, patrons):
+    """(method, url, body, token) tuples for count requests of a scenario"""
+
+    requests = []
+    for _ in range(count):
+        if scenario == "login":
+            email = f"patron{random.randrange(patrons)}@bench.test"
+            requests.append(("POST", "/api/v1/users/login/", {"email": email, "password": PASSWORD}, None))
+        elif scenario == "catalog":
+            after_id = random.randrange(len(free_books) + 1)
+            requests.append(("GET", f"/api/v1/books/?limit=100&after_id={after_id}", None, None))
+        elif scenario == "checkout":
+            body = {"book_id": free_books.pop(), "patron_id": random.choice(patron_ids)}
+            requests.append(("POST", "/api/v1/issues/", body, tokens["librarian"]))
+        elif scenario == "patron_search":
+            query = random.choice(LAST_NAMES)[:random.randint(3, 5)].lower()
+            requests.append(("GET", f"/api/v1/users/patrons/?query={query}&limit=20", None, tokens["librarian"]))
+    return requests
+
+
+def _headers(token):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Token {token}"
+    return headers
+
+
+def client_sender(app):
+    client = app.test_client()
+
+    def send(method, url, body, token):
+        res = client.open(url, method=method, headers=_headers(token),
+                          data=json.dumps(body) if body is not None else None)
+        return res.status_code, res.headers.get("Server-Timing", "")
+
+    return send
+
+
+def server_sender(host, port):
+    def send(method, url, body, token):
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        try:
+            connection.request(method, url, body=json.dumps(body) if body is not None else None,
+                               headers=_headers(token))
+            res = connection.getresponse()
+            res.read()
+            return res.status, res.getheader("Server-Timing", "")
+        finally:
+            connection.close()
+
+    return send
+
+
+def run_scenario(send, requests, concurrency):
+    """Send requests from concurrency threads and summarize the responses"""
+
+    def timed(request):
+        start = time.perf_counter()
+        status, server_timing = send(*request)
+        match = SERVER_TIMING_QUERIES.search(server_timing)
+        return (time.perf_counter() - start) * 1000, status, int(match.group(1)) if match else 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, requests))
+    elapsed = time.perf_counter() - start
+
+    stats = summarize([timing for timing, _, _ in results])
+    stats.update({
+        "requests": len(results),
+        "errors": sum(1 for _, status, _ in results if status >= 400),
+        "req_per_s": len(results) / elapsed,
+        "queries_per_request": sum(queries for _, _, queries in results) / len(results),
+    })
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite:///bench_load.db")
+    parser.add_argument("--books", type=int, default=20000)
+    parser.add_argument("--isbns", type=int, default=5000)
+    parser.add_argument("--patrons", type=int, default=2000)
+    parser.add_argument("--issues", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads against the WSGI server")
+    parser.add_argument("--modes", default="client,server")
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--bcrypt-rounds", type=int, help="bcrypt cost (default: the production setting)")
+    parser.add_argument("--output", default="bench_load.json")
+    args = parser.parse_args()
+
+    modes = [mode for mode in args.modes.split(",") if mode]
+    if args.requests * len(modes) > args.books:
+        parser.error("every checkout needs its own book, raise --books or lower --requests")
+
+    app = make_app(args.database_url)
+    from src.config import app_config
+    from src.models import db
+    from src.shared.Hashing import password_hasher
+
+    if args.bcrypt_rounds is None:
+        args.bcrypt_rounds = app_config["production"].BCRYPT_LOG_ROUNDS
+    app.config["BCRYPT_LOG_ROUNDS"] = args.bcrypt_rounds
+    password_hasher.init_app(app)
+
+    with app.app_context():
+        start = time.perf_counter()
+        book_ids, patron_ids = seed_library(db, args.books, args.isbns, args.patrons, args.issues)
+        seeded = time.perf_counter() - start
+    print(f"seeded {args.books} books, {args.isbns} ISBNs, {args.patrons} patrons, "
+          f"{args.issues} past issues in {seeded:.1f} s, bcrypt cost {args.bcrypt_rounds}")
+
+    client = app.test_client()
+    tokens = {}
+    for role in ("admin", "librarian"):
+        res = client.post("/api/v1/users/login/", headers=_headers(None),
+                          data=json.dumps({"email": f"{role}@bench.test", "password": PASSWORD}))
+        tokens[role] = res.get_json()["jwt_token"]
+    free_books = random.sample(book_ids, len(book_ids))
+
+    results = {}
+    for mode in modes:
+        if mode == "client":
+            send, concurrency, server = client_sender(app), 1, None
+        elif mode == "server":
+            from werkzeug.serving import WSGIRequestHandler, make_server
+
+            class QuietHandler(WSGIRequestHandler):
+                def log_request(self, *args, **kwargs):
+                    pass
+
+            server = make_server("127.0.0.1", args.port, app, threaded=True, request_handler=QuietHandler)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            send, concurrency = server_sender("127.0.0.1", args.port), args.concurrency
+        else:
+            parser.error(f"unknown mode {mode}")
+
+        results[mode] = {}
+        for scenario in SCENARIOS:
+            requests = build_requests(scenario, args.requests, tokens, free_books, patron_ids, args.patrons)
+            results[mode][scenario] = run_scenario(send, requests, concurrency)
+        if server is not None:
+            server.shutdown()
+
+    print(f"{'mode':>7} {'scenario':>14} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'queries':>8} {'errors':>7}")
+    for mode, scenarios in results.items():
+        for scenario, stats in scenarios.items():
+            print(f"{mode:>7} {scenario:>14} {stats['req_per_s']:>9.1f} {stats['p50']:>8.2f} {stats['p95']:>8.2f} "
+                  f"{stats['p99']:>8.2f} {stats['queries_per_request']:>8.1f} {stats['errors']:>7}")
+
+    with open(args.output, "w") as output:
+        json.dump({
+            "finished_at": datetime.datetime.utcnow().isoformat(),
+            "parameters": vars(args),
+            "dialect": args.database_url.split(":", 1)[0],
+            "results": results,
+        }, output, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
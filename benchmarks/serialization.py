@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""List endpoint serialization cost: marshmallow + json.dumps versus compiled dumpers
+
+    python -m benchmarks.serialization --rows 10000
+
+Serializes in-memory BookModel rows, no database involved.
+"""
+import argparse
+import datetime
+import os
+
+from .common import summarize, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+    os.environ.setdefault("DATABASE_TEST_URL", "sqlite://")
+    from flask import json
+    from src.app import create_app
+    from src.models.BookModel import BookModel, BookSchema
+    from src.shared import Serialization
+
+    app = create_app("testing")
+    schema = BookSchema()
+    dump_book = Serialization.compile_dumper(schema)
+    now = datetime.datetime.utcnow()
+    books = []
+    for i in range(args.rows):
+        book = BookModel({"isbn": f"978-{i:05d}", "title": f"Book {i}", "location": "B-1"})
+        book.id, book.created_at, book.modified_at = i, now, now
+        books.append(book)
+
+    methods = [
+        ("marshmallow + json", lambda: json.dumps(schema.dump(books, many=True))),
+        ("compiled + json", lambda: json.dumps(Serialization.dump_many(dump_book, books))),
+    ]
+    if Serialization.orjson is not None:
+        methods.append(("compiled + orjson", lambda: Serialization.orjson.dumps(
+            Serialization.dump_many(dump_book, books))))
+
+    print(f"{args.rows} rows per call")
+    print(f"{'method':>20} {'p50 ms':>8} {'p95 ms':>8}")
+    with app.app_context():
+        for name, method in methods:
+            stats = summarize(time_calls(method, args.repeat))
+            print(f"{name:>20} {stats['p50']:>8.2f} {stats['p95']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
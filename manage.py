@@ -1,10 +1,18 @@
 #!/usr/bin/env python3
 
+import datetime
 import os
-from flask_script import Manager
+import sys
+from flask_script import Manager, Command, Option
 from flask_migrate import Migrate, MigrateCommand
 
 from src.app import create_app, db
+from src.shared.Seed import seed_database
+from src.services.BookService import import_books, read_csv, read_ndjson, DEFAULT_IMPORT_CHUNK_SIZE
+from src.services import IssueService, ReportService
+from src.services.SearchService import create_search_indexes
+from src.shared.Pagination import stream_csv, stream_ndjson
+from src.shared.Hashing import calibrate
 
 
 env_name = os.getenv('FLASK_ENV')
@@ -16,5 +24,81 @@ manager = Manager(app=app)
 
 manager.add_command('db', MigrateCommand)
 
+
+@manager.option('--sample-users', dest='sample_users', action='store_true',
+                default=env_name == 'development', help='Also insert the sample users')
+def seed(sample_users):
+    """Insert the roles and sample users that are missing"""
+    roles, users = seed_database(sample_users=sample_users)
+    print(f'Seeded {roles} roles and {users} users')
+
+
+class ImportBooks(Command):
+    """Import books from an NDJSON or CSV file in batches"""
+
+    option_list = (
+        Option('path', help='NDJSON file, or CSV file with an isbn,title,location header'),
+        Option('--chunk-size', dest='chunk_size', type=int, default=DEFAULT_IMPORT_CHUNK_SIZE,
+               help='Rows validated and inserted per batch'),
+    )
+
+    def run(self, path, chunk_size):
+        reader = read_csv if path.endswith('.csv') else read_ndjson
+        with open(path, encoding='utf-8', newline='') as rows:
+            result = import_books(reader(rows), chunk_size)
+        for error in result['errors']:
+            print(f'Row {error["row"]}: {error["errors"]}')
+        print(f'Imported {result["imported"]} books, rejected {len(result["errors"])} rows')
+
+
+manager.add_command('import-books', ImportBooks())
+
+
+@manager.command
+def search_indexes():
+    """Create the Postgres full-text and trigram book and patron search indexes"""
+    with db.engine.begin() as connection:
+        create_search_indexes(connection)
+    print('Search indexes created')
+
+
+@manager.option('--target-ms', dest='target_ms', type=float, default=250.0,
+                help='Login latency budget for one password check')
+@manager.option('--samples', dest='samples', type=int, default=3, help='Hashes timed per cost')
+def calibrate_hashing(target_ms, samples):
+    """Suggest a BCRYPT_LOG_ROUNDS value for this machine"""
+    suggested, timings = calibrate(target_ms, samples)
+    for rounds, ms in timings.items():
+        print(f'rounds={rounds:>2}  {ms:>9.1f} ms')
+    print(f'Suggested BCRYPT_LOG_ROUNDS={suggested} (target {target_ms:.0f} ms), '
+          f'stored hashes are upgraded on the next login')
+
+
+@manager.command
+def refresh_loan_counts():
+    """Recount the patrons' active, total and overdue loans (run periodically)"""
+    IssueService.refresh_loan_counts()
+    print('Loan counts refreshed')
+
+
+@manager.option('--format', dest='output_format', choices=('csv', 'ndjson'), default='csv')
+@manager.option('--output', dest='output', default='-', help='File to write, - for stdout')
+@manager.option('--as-of', dest='as_of', default=None, help='ISO 8601 date, defaults to now')
+def overdue_report(output_format, output, as_of):
+    """Export the overdue issues as CSV or NDJSON"""
+    rows = ReportService.overdue_report(datetime.datetime.fromisoformat(as_of) if as_of else None)
+    if output_format == 'csv':
+        chunks = stream_csv(rows, ReportService.OVERDUE_FIELDS)
+    else:
+        chunks = (chunk.decode('utf-8') for chunk in stream_ndjson(rows))
+    out = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8', newline='')
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
 if __name__ == '__main__':
     manager.run()
@@ -2,15 +2,22 @@ from flask import Flask
 
 from .config import app_config
 from .models import db, bcrypt
+from .shared.Authentication import token_version_cache
+from .shared.Identity import role_cache
+from .shared.Hashing import password_hasher
+from .shared.ResponseCache import response_cache
+from .shared.QueryMetrics import query_metrics
 
 from .views.UserView import user_api as user_blueprint
 from .views.BookView import book_api as book_blueprint
 from .views.BookView import issue_api as issue_blueprint
+from .views.MetricsView import metrics_api as metrics_blueprint
 
 from flask_user import roles_required, UserMixin
 
 from .models.UserModel import UserModel, UserSchema, Role, UserRoles
-from .models.BookModel import BookModel
+from .models.BookModel import BookModel, availability_cache, copy_count_cache
+from .services.SearchService import search_index
 from .models.BookModel import BookIssueModel
 
 import logging
@@ -24,55 +31,22 @@ def create_app(env_name):
 
     bcrypt.init_app(app)
 
+    password_hasher.init_app(app)
+
     db.init_app(app)
 
+    role_cache.init_app(app, "ROLE_CACHE")
+    token_version_cache.init_app(app, "TOKEN_VERSION_CACHE")
+    copy_count_cache.init_app(app, "COPY_COUNT_CACHE")
+    availability_cache.init_app(app, "AVAILABILITY_CACHE")
+    search_index.invalidate()
+    response_cache.init_app(app)
+    query_metrics.init_app(app)
+
     app.register_blueprint(user_blueprint, url_prefix='/api/v1/users')
     app.register_blueprint(book_blueprint, url_prefix='/api/v1/books')
     app.register_blueprint(issue_blueprint, url_prefix='/api/v1/issues')
-
-    @app.before_request
-    def before_request_func():
-        """Insert test roles and users for development"""
-        if env_name == 'development':
-            if not Role.query.all():
-                role1 = Role(name='Admin')
-                role2 = Role(name='Librarian')
-                role3 = Role(name='Patron')
-
-                db.session.add(role1)
-                db.session.add(role2)
-                db.session.add(role3)
-
-                db.session.commit()
-
-        if not UserModel.query.all():
-            users = [
-                {
-                    "role": "Admin",
-                    "data": {"name": "Ben White", "email": "ben@test.com", "password": "testpass123"}
-                },
-                {
-
-                    "role": "Librarian",
-                    "data": {"name": "Sarah Smith", "email": "sarah@test.com", "password": "testpass123"}
-                },
-
-                {
-                    "role": "Patron",
-                    "data": {"name": "Jessica Parker", "email": "jess@test.com", "password": "testpass123"}
-                },
-
-                {
-                    "role": "Patron",
-                    "data": {"name": "Angelina Jolie", "email": "angie@test.com", "password": "testpass123"}
-                }
-            ]
-
-            for user_data in users:
-                new_user = UserModel(user_data["data"])
-                new_user.roles = [Role.query.filter_by(name=user_data["role"]).first(), ]
-                db.session.add(new_user)
-                db.session.commit()
+    app.register_blueprint(metrics_blueprint, url_prefix='/internal/metrics')
 
     @app.route('/', methods=['GET'])
     def index():
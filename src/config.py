@@ -11,6 +11,35 @@ class Development(object):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': os.getenv('DATABASE_REPLICA_URL')} if os.getenv('DATABASE_REPLICA_URL') else None
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))
+    ROLE_CACHE_TTL = int(os.getenv('ROLE_CACHE_TTL', 0))
+    ROLE_CACHE_SIZE = int(os.getenv('ROLE_CACHE_SIZE', 1024))
+    JWT_STATELESS = os.getenv('JWT_STATELESS', '').lower() == 'true'
+    JWT_STATELESS_EXPIRY_MINUTES = int(os.getenv('JWT_STATELESS_EXPIRY_MINUTES', 60))
+    TOKEN_VERSION_CACHE_TTL = int(os.getenv('TOKEN_VERSION_CACHE_TTL', 30))
+    TOKEN_VERSION_CACHE_SIZE = int(os.getenv('TOKEN_VERSION_CACHE_SIZE', 10000))
+    COPY_COUNT_CACHE_TTL = int(os.getenv('COPY_COUNT_CACHE_TTL', 60))
+    COPY_COUNT_CACHE_SIZE = int(os.getenv('COPY_COUNT_CACHE_SIZE', 10000))
+    AVAILABILITY_CACHE_TTL = int(os.getenv('AVAILABILITY_CACHE_TTL', 5))
+    AVAILABILITY_CACHE_SIZE = int(os.getenv('AVAILABILITY_CACHE_SIZE', 10000))
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 10))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 4))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 32))
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))
+    RESPONSE_CACHE_REDIS_URL = os.getenv('RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    QUERY_METRICS = os.getenv('QUERY_METRICS', '').lower() == 'true'
+    QUERY_METRICS_MAX_QUERIES = int(os.getenv('QUERY_METRICS_MAX_QUERIES', 20))
+    QUERY_METRICS_MAX_DB_MS = int(os.getenv('QUERY_METRICS_MAX_DB_MS', 100))
+    QUERY_METRICS_REPEAT_THRESHOLD = int(os.getenv('QUERY_METRICS_REPEAT_THRESHOLD', 5))
+    LOAN_LIMIT = int(os.getenv('LOAN_LIMIT', 10))
 
 
 class Production(object):
@@ -19,7 +48,36 @@ class Production(object):
     TESTING = False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': os.getenv('DATABASE_REPLICA_URL')} if os.getenv('DATABASE_REPLICA_URL') else None
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
+    ROLE_CACHE_TTL = int(os.getenv('ROLE_CACHE_TTL', 0))
+    ROLE_CACHE_SIZE = int(os.getenv('ROLE_CACHE_SIZE', 1024))
+    JWT_STATELESS = os.getenv('JWT_STATELESS', '').lower() == 'true'
+    JWT_STATELESS_EXPIRY_MINUTES = int(os.getenv('JWT_STATELESS_EXPIRY_MINUTES', 60))
+    TOKEN_VERSION_CACHE_TTL = int(os.getenv('TOKEN_VERSION_CACHE_TTL', 30))
+    TOKEN_VERSION_CACHE_SIZE = int(os.getenv('TOKEN_VERSION_CACHE_SIZE', 10000))
+    COPY_COUNT_CACHE_TTL = int(os.getenv('COPY_COUNT_CACHE_TTL', 60))
+    COPY_COUNT_CACHE_SIZE = int(os.getenv('COPY_COUNT_CACHE_SIZE', 10000))
+    AVAILABILITY_CACHE_TTL = int(os.getenv('AVAILABILITY_CACHE_TTL', 5))
+    AVAILABILITY_CACHE_SIZE = int(os.getenv('AVAILABILITY_CACHE_SIZE', 10000))
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 10))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 4))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 32))
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))
+    RESPONSE_CACHE_REDIS_URL = os.getenv('RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    QUERY_METRICS = os.getenv('QUERY_METRICS', '').lower() == 'true'
+    QUERY_METRICS_MAX_QUERIES = int(os.getenv('QUERY_METRICS_MAX_QUERIES', 20))
+    QUERY_METRICS_MAX_DB_MS = int(os.getenv('QUERY_METRICS_MAX_DB_MS', 100))
+    QUERY_METRICS_REPEAT_THRESHOLD = int(os.getenv('QUERY_METRICS_REPEAT_THRESHOLD', 5))
+    LOAN_LIMIT = int(os.getenv('LOAN_LIMIT', 10))
 
 
 class Testing(object):
@@ -28,6 +86,16 @@ class Testing(object):
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_TEST_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DB_POOL_PRE_PING = False
+    ROLE_CACHE_TTL = 0
+    JWT_STATELESS = False
+    TOKEN_VERSION_CACHE_TTL = 60
+    COPY_COUNT_CACHE_TTL = 60
+    AVAILABILITY_CACHE_TTL = 60
+    BCRYPT_LOG_ROUNDS = 4
+    RESPONSE_CACHE_BACKEND = 'memory'
+    QUERY_METRICS = True
+    LOAN_LIMIT = 10
 
 app_config = {
     'development': Development,
@@ -0,0 +1,48 @@
+from ..models import db
+
+
+class BaseDao:
+    """Data access shared by all models
+
+    Methods documented as replica reads may be answered by the read
+    replica and are only for data that is displayed, not changed. Plain
+    get() and the write methods always use the primary.
+    """
+
+    model = None
+    session = db.session
+
+    @staticmethod
+    def reading():
+        """Context in which queries may go to the read replica"""
+        return db.session().use_replica()
+
+    @classmethod
+    def get(cls, instance_id):
+        return cls.model.query.get(instance_id)
+
+    @classmethod
+    def get_readonly(cls, instance_id):
+        """Replica read of one instance"""
+        with cls.reading():
+            return cls.model.query.get(instance_id)
+
+    @classmethod
+    def add(cls, instance):
+        cls.session.add(instance)
+
+    @classmethod
+    def delete(cls, instance):
+        cls.session.delete(instance)
+
+    @classmethod
+    def update(cls, instance_id, updated_fields):
+        cls.model.query.filter_by(id=instance_id).update(updated_fields)
+
+    @classmethod
+    def commit(cls):
+        cls.session.commit()
+
+    @classmethod
+    def rollback(cls):
+        cls.session.rollback()
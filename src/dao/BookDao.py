@@ -0,0 +1,41 @@
+from .BaseDao import BaseDao
+from ..models.BookModel import BookModel, BookIssueModel
+from ..services.SearchService import search_books
+
+
+class BookDao(BaseDao):
+    model = BookModel
+
+    @classmethod
+    def get_books_page(cls, after_id=None, limit=None):
+        """Replica read of a page of catalog rows"""
+        with cls.reading():
+            return BookModel.get_books_page(after_id, limit)
+
+    @classmethod
+    def iter_books(cls, chunk_size):
+        """Replica read of the whole catalog, chunk_size rows at a time"""
+        with cls.reading():
+            yield from BookModel.iter_all_books(chunk_size)
+
+    @classmethod
+    def get_books_by_isbn(cls, isbn):
+        """Replica read of all copies of a book"""
+        with cls.reading():
+            return BookModel.query.filter(BookModel.isbn == isbn).all()
+
+    @classmethod
+    def search(cls, query, limit, offset=0):
+        """Replica read of the best matching books"""
+        with cls.reading():
+            return search_books(query, limit, offset)
+
+
+class BookIssueDao(BaseDao):
+    model = BookIssueModel
+
+    @classmethod
+    def get_issues_page(cls, after_id=None, limit=None, **filters):
+        """Replica read of a page of filtered issue rows"""
+        with cls.reading():
+            return BookIssueModel.get_issues_page(after_id, limit, **filters)
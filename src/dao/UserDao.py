@@ -0,0 +1,14 @@
+from .BaseDao import BaseDao
+from ..models.UserModel import UserModel
+
+
+class UserDao(BaseDao):
+    model = UserModel
+
+    @classmethod
+    def get_users_page(cls, role, query=None, after_id=None, limit=None):
+        """Replica read of users having role, optionally matching query"""
+        with cls.reading():
+            if query:
+                return UserModel.get_users_by_role_and_query(role, query, after_id, limit)
+            return UserModel.get_users_by_role(role, after_id, limit)
@@ -1,6 +1,10 @@
 # Faili nimi peaks olema book_model (PEP-8)
 from marshmallow import fields, Schema
+from sqlalchemy import and_, func
 from . import db
+from .UserModel import UserModel
+from ..shared.Cache import TTLCache
+from ..shared.Serialization import schema_columns
 import datetime
 
 
@@ -77,13 +81,19 @@ class BookDao(BaseDao):
         return cls.model.query.filter(cls.model.isbn == isbn).all()
 
 '''
+# Per-ISBN copy counts, dropped whenever a copy is added, changed or removed
+copy_count_cache = TTLCache(maxsize=0)
+# Short-lived per-ISBN availability, also dropped on checkout and return
+availability_cache = TTLCache(maxsize=0)
+
+
 class BookModel(db.Model):
     """Book Model"""
 
     __tablename__ = "books"
 
     id = db.Column(db.Integer, primary_key=True)
-    isbn = db.Column(db.String(128), nullable=False)
+    isbn = db.Column(db.String(128), nullable=False, index=True)
     title = db.Column(db.String(128), nullable=False)
     location = db.Column(db.String(128), nullable=False)
     created_at = db.Column(db.DateTime)
@@ -104,28 +114,111 @@ class BookModel(db.Model):
     def save(self):
         db.session.add(self)
         db.session.commit()
+        copy_count_cache.delete(self.isbn)
+        availability_cache.delete(self.isbn)
 
     def update(self, data):
+        old_isbn = self.isbn
         for key, item in data.items():
             setattr(self, key, item)
-            self.modified_at = datetime.datetime.utcnow()
-            db.session.commit()
+        self.modified_at = datetime.datetime.utcnow()
+        db.session.commit()
+        for changed_isbn in (old_isbn, self.isbn):
+            copy_count_cache.delete(changed_isbn)
+            availability_cache.delete(changed_isbn)
 
     def delete(self):
+        isbn = self.isbn
         db.session.delete(self)
         db.session.commit()
+        copy_count_cache.delete(isbn)
+        availability_cache.delete(isbn)
 
-    def get_max_issue_period_in_days(self):
+    def get_max_issue_period_in_days(self, copies=None):
         if (datetime.datetime.utcnow() - self.created_at).days <= BookModel.days_book_considered_new:
             return BookModel.short_issue_period_days
-        if len(BookModel.query.filter(BookModel.isbn==self.isbn).all()) < BookModel.book_shortage_number:
+        if copies is None:
+            copies = BookModel.count_copies(self.isbn)
+        if copies < BookModel.book_shortage_number:
             return BookModel.short_issue_period_days
         return BookModel.standard_issue_period_days
 
+    @staticmethod
+    def count_copies(isbn):
+        count = copy_count_cache.get(isbn)
+        if count is None:
+            count = db.session.query(func.count(BookModel.id)) \
+                      .filter(BookModel.isbn == isbn) \
+                      .scalar()
+            copy_count_cache.set(isbn, count)
+        return count
+
+    @staticmethod
+    def count_copies_many(isbns):
+        counts = {}
+        missing = []
+        for isbn in set(isbns):
+            count = copy_count_cache.get(isbn)
+            if count is None:
+                missing.append(isbn)
+            else:
+                counts[isbn] = count
+        if missing:
+            rows = db.session.query(BookModel.isbn, func.count(BookModel.id)) \
+                     .filter(BookModel.isbn.in_(missing)) \
+                     .group_by(BookModel.isbn)
+            for isbn, count in rows:
+                counts[isbn] = count
+                copy_count_cache.set(isbn, count)
+        return counts
+
+    @staticmethod
+    def get_availability(isbns):
+        """Total copies, available copies and next due date per ISBN
+
+        ISBNs missing from availability_cache are answered by one aggregate
+        query over books LEFT JOIN their active issues. Unknown ISBNs have
+        no copies.
+        """
+        availability = {}
+        missing = []
+        for isbn in set(isbns):
+            entry = availability_cache.get(isbn)
+            if entry is None:
+                missing.append(isbn)
+            else:
+                availability[isbn] = entry
+        if missing:
+            rows = db.session.query(
+                       BookModel.isbn, func.count(BookModel.id), func.count(BookIssueModel.id),
+                       func.min(BookIssueModel.due_date),
+                   ) \
+                   .outerjoin(BookIssueModel, and_(BookIssueModel.book_id == BookModel.id,
+                                                   BookIssueModel.is_active == True)) \
+                   .filter(BookModel.isbn.in_(missing)) \
+                   .group_by(BookModel.isbn)
+            found = {isbn: (total, total - issued, next_due) for isbn, total, issued, next_due in rows}
+            for isbn in missing:
+                entry = found.get(isbn, (0, 0, None))
+                availability_cache.set(isbn, entry)
+                availability[isbn] = entry
+        return availability
+
     @staticmethod
     def get_all_books():
         return BookModel.query.all()
 
+    @staticmethod
+    def get_books_page(after_id=None, limit=None):
+        query = db.session.query(*BOOK_COLUMNS).order_by(BookModel.id)
+        if after_id is not None:
+            query = query.filter(BookModel.id > after_id)
+        return query.limit(limit).all()
+
+    @staticmethod
+    def iter_all_books(chunk_size):
+        return db.session.query(*BOOK_COLUMNS).order_by(BookModel.id).yield_per(chunk_size)
+
     @staticmethod
     def get_one_book(id):
         return BookModel.query.get(id)
@@ -145,6 +238,9 @@ class BookSchema(Schema):
     modified_at = fields.DateTime(dump_only=True)
 
 
+BOOK_COLUMNS = schema_columns(BookModel, BookSchema())
+
+
 class BookIssueModel(db.Model):
     """Book Issue Model"""
 
@@ -162,11 +258,24 @@ class BookIssueModel(db.Model):
     created_at = db.Column(db.DateTime)
     modified_at = db.Column(db.DateTime)
 
-    def __init__(self, data):
+    # At most one active issue per book, also the index behind is_book_issued;
+    # the overdue report and due date filters walk (is_active, due_date), the
+    # issue listing filters by book or by patron
+    __table_args__ = (
+        db.Index(
+            "ix_issues_active_book_id", "book_id", unique=True,
+            postgresql_where=is_active == True, sqlite_where=is_active == True,
+        ),
+        db.Index("ix_issues_is_active_due_date", "is_active", "due_date"),
+        db.Index("ix_issues_book_id", "book_id"),
+        db.Index("ix_issues_patron_id_is_active", "patron_id", "is_active"),
+    )
+
+    def __init__(self, data, book=None, copies=None):
         self.is_active = data.get("is_active")
         self.book_id = data.get("book_id")
         self.patron_id = data.get("patron_id")
-        self.due_date = self.set_due_date()
+        self.due_date = self.set_due_date(book, copies)
         self.created_at = datetime.datetime.utcnow()
         self.modified_at = datetime.datetime.utcnow()
 
@@ -177,21 +286,101 @@ class BookIssueModel(db.Model):
     def update(self, data):
         for key, item in data.items():
             setattr(self, key, item)
-            self.modified_at = datetime.datetime.utcnow()
-            db.session.commit()
+        self.modified_at = datetime.datetime.utcnow()
+        db.session.commit()
 
     def delete(self):
         db.session.delete(self)
         db.session.commit()
 
-    def set_due_date(self):
-        days = BookModel.get_one_book(self.book_id).get_max_issue_period_in_days()
+    def set_due_date(self, book=None, copies=None):
+        book = book or BookModel.get_one_book(self.book_id)
+        days = book.get_max_issue_period_in_days(copies)
         return datetime.datetime.now() + datetime.timedelta(days=days)
 
+    @staticmethod
+    def deactivate(*criteria):
+        """Mark the matching active issues returned, without committing
+
+        Uses UPDATE ... RETURNING where the database supports it, otherwise
+        locks and reads the matching ids, then updates each one that is still
+        active (SQLite ignores the lock, so a concurrent return may have
+        closed it meanwhile). Updates the patrons' loan counters and answers
+        the (id, book_id, patron_id, due_date) rows of the issues that were
+        returned.
+        """
+        table = BookIssueModel.__table__
+        condition = and_(table.c.is_active == True, *criteria)
+        values = {"is_active": False, "modified_at": datetime.datetime.utcnow()}
+        columns = (table.c.id, table.c.book_id, table.c.patron_id, table.c.due_date)
+
+        if db.session.get_bind().dialect.implicit_returning:
+            rows = db.session.execute(
+                table.update().where(condition).values(**values).returning(*columns)
+            ).fetchall()
+        else:
+            rows = db.session.query(*columns) \
+                     .filter(condition) \
+                     .with_for_update() \
+                     .all()
+            rows = [
+                row for row in rows
+                if db.session.execute(
+                    table.update().where(and_(table.c.id == row.id, table.c.is_active == True)).values(**values)
+                ).rowcount == 1
+            ]
+        if rows:
+            UserModel.remove_loans(rows)
+        return rows
+
     @staticmethod
     def get_all_issues():
         return BookIssueModel.query.all()
 
+    @staticmethod
+    def query_overdue(as_of):
+        """Active issues due before as_of with book and patron details, most overdue first"""
+        return db.session.query(
+                   BookIssueModel.id.label("issue_id"), BookIssueModel.book_id, BookModel.isbn,
+                   BookModel.title, BookIssueModel.patron_id, UserModel.name.label("patron_name"),
+                   UserModel.email.label("patron_email"), BookIssueModel.due_date,
+               ) \
+               .join(BookModel, BookModel.id == BookIssueModel.book_id) \
+               .join(UserModel, UserModel.id == BookIssueModel.patron_id) \
+               .filter(BookIssueModel.is_active == True) \
+               .filter(BookIssueModel.due_date < as_of) \
+               .order_by(BookIssueModel.due_date, BookIssueModel.id)
+
+    @staticmethod
+    def get_issues_page(after_id=None, limit=None, is_active=None, patron_id=None, book_id=None,
+                        due_after=None, due_before=None, embed=()):
+        """Rows of ISSUE_COLUMNS matching the given filters, by id
+
+        embed may hold "book" (adds book_isbn, book_title) and "patron"
+        (adds patron_name, patron_email), joined into the same query.
+        """
+        query = db.session.query(*ISSUE_COLUMNS)
+        if "book" in embed:
+            query = query.join(BookModel, BookModel.id == BookIssueModel.book_id) \
+                         .add_columns(BookModel.isbn.label("book_isbn"), BookModel.title.label("book_title"))
+        if "patron" in embed:
+            query = query.join(UserModel, UserModel.id == BookIssueModel.patron_id) \
+                         .add_columns(UserModel.name.label("patron_name"), UserModel.email.label("patron_email"))
+
+        if is_active is not None:
+            query = query.filter(BookIssueModel.is_active == is_active)
+        if patron_id is not None:
+            query = query.filter(BookIssueModel.patron_id == patron_id)
+        if book_id is not None:
+            query = query.filter(BookIssueModel.book_id == book_id)
+        if due_after is not None:
+            query = query.filter(BookIssueModel.due_date >= due_after)
+        if due_before is not None:
+            query = query.filter(BookIssueModel.due_date < due_before)
+        if after_id is not None:
+            query = query.filter(BookIssueModel.id > after_id)
+        return query.order_by(BookIssueModel.id).limit(limit).all()
+
     @staticmethod
     def get_one_issue(id):
         return BookIssueModel.query.get(id)
@@ -218,3 +407,6 @@ class BookIssueSchema(Schema):
     due_date = fields.DateTime(dump_only=True)
     created_at = fields.DateTime(dump_only=True)
     modified_at = fields.DateTime(dump_only=True)
+
+
+ISSUE_COLUMNS = schema_columns(BookIssueModel, BookIssueSchema())
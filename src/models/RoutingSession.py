@@ -0,0 +1,86 @@
+from contextlib import contextmanager
+from flask_sqlalchemy import SQLAlchemy, SignallingSession, get_state
+from sqlalchemy import orm
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+from ..shared.PoolMetrics import InstrumentedQueuePool
+
+
+REPLICA_BIND = "replica"
+
+# create_engine() options and the config keys setting them
+POOL_OPTIONS = (
+    ("pool_size", "DB_POOL_SIZE"),
+    ("max_overflow", "DB_MAX_OVERFLOW"),
+    ("pool_timeout", "DB_POOL_TIMEOUT"),
+    ("pool_recycle", "DB_POOL_RECYCLE"),
+    ("pool_pre_ping", "DB_POOL_PRE_PING"),
+)
+QUEUE_POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout")
+
+
+class RoutingSession(SignallingSession):
+    """Session that can send reads to a read replica
+
+    Queries run inside use_replica() go to the "replica" entry of
+    SQLALCHEMY_BINDS when one is configured, everything else goes to the
+    primary. Once the session has written (flushed, or executed an INSERT,
+    UPDATE or DELETE) it stays on the primary, so a request reads its own
+    writes; the session is removed at the end of every request.
+    use_primary() keeps reads on the primary even inside use_replica(),
+    for results that outlive the request (shared caches).
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["wrote"] = True
+        elif self.info.get("use_replica") and not self.info.get("use_primary") and not self.info.get("wrote"):
+            if REPLICA_BIND in (self.app.config.get("SQLALCHEMY_BINDS") or {}):
+                return get_state(self.app).db.get_engine(self.app, bind=REPLICA_BIND)
+        return SignallingSession.get_bind(self, mapper, clause)
+
+    @contextmanager
+    def _routing(self, key):
+        previous = self.info.get(key, False)
+        self.info[key] = True
+        try:
+            yield self
+        finally:
+            self.info[key] = previous
+
+    def use_replica(self):
+        return self._routing("use_replica")
+
+    def use_primary(self):
+        return self._routing("use_primary")
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with RoutingSession as its session class
+
+    Engines get an InstrumentedQueuePool sized by the DB_POOL_* settings.
+    Pools that do not queue (in-memory SQLite) ignore the sizing options.
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_pool_defaults(self, app, options):
+        SQLAlchemy.apply_pool_defaults(self, app, options)
+        for option, key in POOL_OPTIONS:
+            if app.config.get(key) is not None:
+                options[option] = app.config[key]
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        SQLAlchemy.apply_driver_hacks(self, app, sa_url, options)
+        poolclass = options.get("poolclass")
+        if poolclass is None:
+            options["poolclass"] = InstrumentedQueuePool
+        elif not issubclass(poolclass, QueuePool):
+            for option in QUEUE_POOL_OPTIONS:
+                options.pop(option, None)
+
+        timeout = app.config.get("DB_STATEMENT_TIMEOUT_MS")
+        if timeout and sa_url.get_backend_name() == "postgresql":
+            connect_args = options.setdefault("connect_args", {})
+            connect_args["options"] = f"-c statement_timeout={int(timeout)}"
@@ -1,11 +1,13 @@
 from sqlalchemy import Table, Column, Integer, ForeignKey
 from marshmallow import fields, Schema
 from . import db, bcrypt
+from ..shared.Hashing import password_hasher
+from ..shared.Serialization import schema_columns
 import datetime
 import sys
 from flask_user import roles_required, UserMixin, UserManager
-from sqlalchemy.orm import relationship
-from sqlalchemy import or_
+from sqlalchemy.orm import relationship, joinedload
+from sqlalchemy import and_, bindparam, case, or_
 
 '''
 Samad kommentaarid mis BookModel.py failis
@@ -20,6 +22,13 @@ class UserModel(db.Model, UserMixin):
     name = db.Column(db.String(128), nullable=False)
     email = db.Column(db.String(128), unique=True, nullable=False)
     password = db.Column(db.String(128), nullable=False)
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Loan counters kept in step with checkouts and returns; overdue_loans is
+    # recounted by refresh_loan_counts, as of overdue_counted_at
+    active_loans = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    total_loans = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    overdue_loans = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    overdue_counted_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime)
     modified_at = db.Column(db.DateTime)
     roles = db.relationship("Role", secondary="user_roles")
@@ -28,6 +37,7 @@ class UserModel(db.Model, UserMixin):
         self.name = data.get("name")
         self.email = data.get("email")
         self.password = self.__generate_hash(data.get("password"))
+        self.token_version = 0
         self.created_at = datetime.datetime.utcnow()
         self.modified_at = datetime.datetime.utcnow()
 
@@ -35,6 +45,9 @@ class UserModel(db.Model, UserMixin):
         db.session.add(self)
         db.session.commit()
 
+    def revoke_tokens(self):
+        self.token_version = (self.token_version or 0) + 1
+
     @staticmethod
     def get_all_users():
         return UserModel.query.all()
@@ -43,28 +56,96 @@ class UserModel(db.Model, UserMixin):
     def get_one_user(id):
         return UserModel.query.get(id)
 
+    @staticmethod
+    def get_user_with_roles(id):
+        return UserModel.query.options(joinedload(UserModel.roles)).get(id)
+
     @staticmethod
     def get_user_by_email(value):
         return UserModel.query.filter_by(email=value).first()
 
     @staticmethod
-    def get_users_by_role(role):
-        return UserModel.query.filter(UserModel.roles.any(name=role)).all()
+    def query_by_role(role, after_id=None):
+        """Rows of USER_COLUMNS (no password) for users having role, by id"""
+        query = (
+            db.session.query(*USER_COLUMNS)
+            .select_from(UserModel)
+            .join(UserRoles, UserRoles.user_id == UserModel.id)
+            .join(Role, Role.id == UserRoles.role_id)
+            .filter(Role.name == role)
+            .order_by(UserModel.id)
+        )
+        if after_id is not None:
+            query = query.filter(UserModel.id > after_id)
+        return query
+
+    @staticmethod
+    def get_users_by_role(role, after_id=None, limit=None):
+        return UserModel.query_by_role(role, after_id).limit(limit).all()
 
-    def get_users_by_role_and_query(role, query):
+    @staticmethod
+    def get_users_by_role_and_query(role, query, after_id=None, limit=None):
+        pattern = "%{}%".format(query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
         return (
-            UserModel.query.filter(UserModel.roles.any(name=role))
+            UserModel.query_by_role(role, after_id)
             .filter(
-                or_(UserModel.name.contains(query), UserModel.email.contains(query))
+                or_(UserModel.name.ilike(pattern, escape="\\"), UserModel.email.ilike(pattern, escape="\\"))
             )
+            .limit(limit)
             .all()
         )
 
+    @staticmethod
+    def add_loans(patron_id, count=1, limit=None):
+        """Count new loans of a patron, without committing
+
+        With a limit, answers False and changes nothing when the patron
+        would end up with more than limit active loans.
+        """
+        table = UserModel.__table__
+        condition = table.c.id == patron_id
+        if limit:
+            condition = and_(condition, table.c.active_loans + count <= limit)
+        result = db.session.execute(
+            table.update().where(condition)
+            .values(active_loans=table.c.active_loans + count, total_loans=table.c.total_loans + count)
+        )
+        return result.rowcount == 1
+
+    @staticmethod
+    def remove_loans(rows):
+        """Uncount returned (patron_id, due_date) loans, without committing
+
+        A loan also leaves overdue_loans if it was already overdue when the
+        patron's overdue loans were last counted.
+        """
+        table = UserModel.__table__
+        was_counted_overdue = case([(table.c.overdue_counted_at > bindparam("due_date"), 1)], else_=0)
+        db.session.execute(
+            table.update().where(table.c.id == bindparam("patron_id"))
+            .values(active_loans=table.c.active_loans - 1,
+                    overdue_loans=table.c.overdue_loans - was_counted_overdue),
+            [{"patron_id": row.patron_id, "due_date": row.due_date} for row in rows],
+        )
+
+    @staticmethod
+    def hash_password(password):
+        return password_hasher.generate(password)
+
     def __generate_hash(self, password):
-        return bcrypt.generate_password_hash(password, rounds=10).decode("utf-8")
+        return UserModel.hash_password(password)
 
     def check_hash(self, password):
-        return bcrypt.check_password_hash(self.password, password)
+        return password_hasher.check(self.password, password)
+
+    def rehash_if_needed(self, password):
+        """Re-hash a verified password when the configured bcrypt cost changed"""
+        if password_hasher.needs_rehash(self.password):
+            self.password = UserModel.hash_password(password)
+            self.modified_at = datetime.datetime.utcnow()
+            db.session.commit()
+            return True
+        return False
 
     def __repr(self):
         return "<id {}>".format(self.id)
@@ -81,6 +162,10 @@ class UserSchema(Schema):
     modified_at = fields.DateTime(dump_only=True)
 
 
+# password is load_only in UserSchema, so it is never selected
+USER_COLUMNS = schema_columns(UserModel, UserSchema())
+
+
 class Role(db.Model):
     """Role data model"""
 
@@ -98,3 +183,6 @@ class UserRoles(db.Model):
     id = db.Column(db.Integer(), primary_key=True)
     user_id = db.Column(db.Integer(), db.ForeignKey("users.id", ondelete="CASCADE"))
     role_id = db.Column(db.Integer(), db.ForeignKey("roles.id", ondelete="CASCADE"))
+
+    # Role filtering walks role_id -> user_id without touching the table
+    __table_args__ = (db.Index("ix_user_roles_role_id_user_id", "role_id", "user_id"),)
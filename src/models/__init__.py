@@ -1,7 +1,7 @@
-from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
+from .RoutingSession import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 bcrypt = Bcrypt()
 
 from .UserModel import UserModel, UserSchema
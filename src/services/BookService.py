@@ -0,0 +1,118 @@
+import csv
+import datetime
+import json
+from itertools import islice
+from marshmallow import ValidationError
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from ..models import db
+from ..models.BookModel import BookModel, BookSchema, availability_cache, copy_count_cache
+from .SearchService import search_index
+from ..shared.ResponseCache import response_cache
+
+
+DEFAULT_IMPORT_CHUNK_SIZE = 1000
+MAX_IMPORT_CHUNK_SIZE = 10000
+
+book_schema = BookSchema()
+
+
+def read_ndjson(lines):
+    """Yield one book dict per non-empty line, None for lines that are not JSON"""
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def read_csv(lines):
+    """Yield one book dict per CSV row, the first row being the header
+
+    Values beyond the header's columns are collected under "unexpected
+    columns", which validation reports as an unknown field of the row.
+    """
+
+    lines = (line.decode("utf-8") if isinstance(line, bytes) else line for line in lines)
+    for row in csv.DictReader(lines, restkey="unexpected columns"):
+        yield row
+
+
+def import_books(rows, chunk_size=DEFAULT_IMPORT_CHUNK_SIZE):
+    """Validate and insert books in batches of chunk_size rows
+
+    Invalid rows are reported and skipped, every valid batch is committed
+    on its own so one bad row never aborts the whole load. Row numbers in
+    the report start from 1.
+    """
+
+    result = {"imported": 0, "errors": []}
+    rows = iter(rows)
+    offset = 0
+    while True:
+        batch = list(islice(rows, chunk_size))
+        if not batch:
+            return result
+        _import_batch(batch, offset, result)
+        offset += len(batch)
+
+
+def _import_batch(batch, offset, result):
+    try:
+        data = book_schema.load(batch, many=True)
+        errors = {}
+    except ValidationError as err:
+        data, errors = err.valid_data, err.messages
+
+    for index in sorted(errors):
+        result["errors"].append({"row": offset + index + 1, "errors": errors[index]})
+
+    now = datetime.datetime.utcnow()
+    books = [
+        dict(book, created_at=now, modified_at=now)
+        for index, book in enumerate(data) if index not in errors
+    ]
+    if not books:
+        return
+
+    try:
+        db.session.bulk_insert_mappings(BookModel, books)
+        db.session.commit()
+    except SQLAlchemyError as err:
+        db.session.rollback()
+        for index in range(len(batch)):
+            if index not in errors:
+                result["errors"].append({"row": offset + index + 1, "errors": {"_db": [str(getattr(err, "orig", None) or err)]}})
+        return
+
+    result["imported"] += len(books)
+    for isbn in {book["isbn"] for book in books}:
+        copy_count_cache.delete(isbn)
+        availability_cache.delete(isbn)
+    # bulk inserts skip the mapper events that keep the search index and
+    # the cached catalog responses current
+    search_index.invalidate()
+    response_cache.invalidate("books")
+
+
+@event.listens_for(BookModel, "after_insert")
+@event.listens_for(BookModel, "after_update")
+@event.listens_for(BookModel, "after_delete")
+def _book_changed(mapper, connection, target):
+    db.session.info["books_changed"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_catalog_responses(session):
+    if session.info.pop("books_changed", False):
+        response_cache.invalidate("books")
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_catalog_changes(session):
+    session.info.pop("books_changed", None)
@@ -0,0 +1,226 @@
+import datetime
+from flask import current_app as app
+from marshmallow import ValidationError
+from sqlalchemy import and_, func, select
+from sqlalchemy.exc import IntegrityError
+from ..models import db
+from ..models.BookModel import BookModel, BookIssueModel, BookIssueSchema, availability_cache
+from ..models.UserModel import UserModel
+
+
+MAX_BATCH_SIZE = 100
+
+issue_schema = BookIssueSchema(only=("book_id", "patron_id"))
+
+
+class IssueError(Exception):
+    """Rejected issue operation, with the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def checkout(book_id, patron_id):
+    """Issue a book to a patron in a single transaction
+
+    The book row (locked FOR UPDATE where supported), the patron's name and
+    whether the book is already out come back in one query. The due date
+    is computed from the loaded book, so the patron's loan counter update
+    (which also enforces LOAN_LIMIT), the insert and the commit are the only
+    other round trips, plus the ISBN copy count when it is not cached. The
+    unique index on active issues still rejects a concurrent checkout that
+    slips past the lock.
+    """
+
+    patron_name = db.session.query(UserModel.name) \
+                    .filter(UserModel.id == patron_id) \
+                    .as_scalar()
+    issued = db.session.query(BookIssueModel.id) \
+               .filter(BookIssueModel.book_id == book_id) \
+               .filter(BookIssueModel.is_active == True) \
+               .exists()
+    row = db.session.query(BookModel, patron_name, issued) \
+            .filter(BookModel.id == book_id) \
+            .with_for_update(of=BookModel) \
+            .first()
+
+    if not row:
+        db.session.rollback()
+        raise IssueError("book not found", 404)
+    book, patron_name, issued = row
+    if patron_name is None:
+        db.session.rollback()
+        raise IssueError("user not found", 404)
+    if issued:
+        db.session.rollback()
+        raise IssueError("The book is already issued", 400)
+    if not UserModel.add_loans(patron_id, 1, app.config.get("LOAN_LIMIT")):
+        db.session.rollback()
+        raise IssueError("The patron has reached the loan limit", 400)
+
+    issue = BookIssueModel({"book_id": book_id, "patron_id": patron_id}, book=book)
+    db.session.add(issue)
+    title, isbn = book.title, book.isbn  # read before the commit expires the book
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise IssueError("The book is already issued", 400)
+    availability_cache.delete(isbn)
+
+    app.logger.info(f'Issue created, book "{title}" (id={book_id}) to {patron_name} (id={patron_id})')
+    return issue
+
+
+def return_issue(issue_id):
+    """Return the book of an active issue with one conditional update"""
+
+    rows = BookIssueModel.deactivate(BookIssueModel.id == issue_id)
+    db.session.commit()
+    _forget_availability(row.book_id for row in rows)
+    if not rows:
+        if BookIssueModel.get_one_issue(issue_id):
+            raise IssueError("The issue is already closed", 400)
+        raise IssueError("issue not found", 404)
+
+    app.logger.info(f'Issue closed (id={issue_id}), book id={rows[0].book_id} returned')
+    return rows[0]
+
+
+def checkout_many(items):
+    """Issue several books in one transaction, answering one result per item
+
+    Books and patrons (both locked), active issues and copy counts are each
+    read with a single set-based query, then every valid issue is inserted
+    and the loan counters updated and committed together.
+    """
+
+    try:
+        data = issue_schema.load(items, many=True)
+        errors = {}
+    except ValidationError as err:
+        data, errors = err.valid_data, err.messages
+
+    results = [
+        {"book_id": item.get("book_id"), "patron_id": item.get("patron_id")}
+        if isinstance(item, dict) else {}
+        for item in items
+    ]
+    for index, messages in errors.items():
+        results[index].update(status=400, error=messages)
+
+    pending = [index for index in range(len(data)) if index not in errors]
+    book_ids = {data[index]["book_id"] for index in pending}
+    patron_ids = {data[index]["patron_id"] for index in pending}
+
+    books = {}
+    patrons = {}
+    issued = set()
+    if pending:
+        books = {
+            book.id: book
+            for book in BookModel.query.filter(BookModel.id.in_(book_ids)).with_for_update()
+        }
+        patrons = dict(
+            db.session.query(UserModel.id, UserModel.active_loans)
+            .filter(UserModel.id.in_(patron_ids))
+            .with_for_update()
+        )
+        issued = {
+            book_id for (book_id,) in
+            db.session.query(BookIssueModel.book_id)
+            .filter(BookIssueModel.book_id.in_(book_ids))
+            .filter(BookIssueModel.is_active == True)
+        }
+    copies = BookModel.count_copies_many(book.isbn for book in books.values())
+
+    limit = app.config.get("LOAN_LIMIT")
+    loans = {}
+    issues = []
+    for index in pending:
+        book = books.get(data[index]["book_id"])
+        patron_id = data[index]["patron_id"]
+        if not book:
+            results[index].update(status=404, error="book not found")
+        elif patron_id not in patrons:
+            results[index].update(status=404, error="user not found")
+        elif book.id in issued:
+            results[index].update(status=400, error="The book is already issued")
+        elif limit and patrons[patron_id] + loans.get(patron_id, 0) >= limit:
+            results[index].update(status=400, error="The patron has reached the loan limit")
+        else:
+            issued.add(book.id)
+            loans[patron_id] = loans.get(patron_id, 0) + 1
+            issue = BookIssueModel(data[index], book=book, copies=copies[book.isbn])
+            issues.append((index, issue))
+
+    isbns = {books[issue.book_id].isbn for _, issue in issues}
+    db.session.add_all([issue for _, issue in issues])
+    try:
+        for patron_id, count in loans.items():
+            UserModel.add_loans(patron_id, count)
+        db.session.flush()
+        for index, issue in issues:
+            results[index].update(status=201, id=issue.id, due_date=issue.due_date.isoformat())
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        for index, _ in issues:
+            results[index].update(status=409, error="Conflicting checkout, please retry")
+            results[index].pop("id", None)
+            results[index].pop("due_date", None)
+        return results
+
+    for isbn in isbns:
+        availability_cache.delete(isbn)
+    app.logger.info(f'Batch checkout, {len(issues)} of {len(results)} books issued')
+    return results
+
+
+def return_many(book_ids):
+    """Return several books with one conditional update, answering one result per book"""
+
+    returned = {row.book_id for row in BookIssueModel.deactivate(BookIssueModel.book_id.in_(book_ids))}
+    db.session.commit()
+    _forget_availability(returned)
+
+    app.logger.info(f'Batch return, {len(returned)} of {len(book_ids)} books returned')
+    return [
+        {"book_id": book_id, "status": 200} if book_id in returned
+        else {"book_id": book_id, "status": 404, "error": "book is not issued"}
+        for book_id in book_ids
+    ]
+
+
+def _forget_availability(book_ids):
+    """Drop the cached availability of the returned books' ISBNs"""
+
+    book_ids = set(book_ids)
+    if availability_cache.maxsize and book_ids:
+        for (isbn,) in db.session.query(BookModel.isbn).filter(BookModel.id.in_(book_ids)).distinct():
+            availability_cache.delete(isbn)
+
+
+def refresh_loan_counts(as_of=None):
+    """Recount every patron's active, total and overdue loans from the issues
+
+    Run periodically so overdue_loans follows loans passing their due
+    date; also repairs counters of issues changed outside checkout/return.
+    """
+
+    as_of = as_of or datetime.datetime.now()
+    users = UserModel.__table__
+    issues = BookIssueModel.__table__
+
+    def count(*criteria):
+        return select([func.count()]).where(and_(issues.c.patron_id == users.c.id, *criteria)).as_scalar()
+
+    db.session.execute(users.update().values(
+        active_loans=count(issues.c.is_active == True),
+        total_loans=count(),
+        overdue_loans=count(issues.c.is_active == True, issues.c.due_date < as_of),
+        overdue_counted_at=as_of,
+    ))
+    db.session.commit()
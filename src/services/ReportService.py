@@ -0,0 +1,26 @@
+import datetime
+from ..dao.BookDao import BookIssueDao
+from ..models.BookModel import BookIssueModel
+from ..shared.Pagination import STREAM_CHUNK_SIZE
+
+
+OVERDUE_FIELDS = (
+    "issue_id", "book_id", "isbn", "title", "patron_id", "patron_name", "patron_email",
+    "due_date", "days_overdue",
+)
+
+
+def overdue_report(as_of=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the overdue issues as dicts of OVERDUE_FIELDS, most overdue first
+
+    Rows come from one joined query read chunk_size at a time (a replica
+    read), so the report never holds all of them in memory.
+    """
+
+    as_of = as_of or datetime.datetime.now()
+    with BookIssueDao.reading():
+        for row in BookIssueModel.query_overdue(as_of).yield_per(chunk_size):
+            report_row = row._asdict()
+            report_row["days_overdue"] = (as_of - row.due_date).days
+            report_row["due_date"] = row.due_date.isoformat()
+            yield report_row
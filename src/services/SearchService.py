@@ -0,0 +1,179 @@
+import bisect
+import heapq
+import re
+import threading
+from sqlalchemy import DDL, event, func, or_
+from ..models import db
+from ..models.BookModel import BookModel
+from ..models.UserModel import UserModel
+
+
+MAX_SEARCH_LIMIT = 100
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Postgres only, every statement is safe to run again on an existing database
+SEARCH_INDEX_DDL = {
+    BookModel.__table__: [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_books_search_tsv ON books "
+        "USING gin (to_tsvector('simple', title || ' ' || isbn))",
+        "CREATE INDEX IF NOT EXISTS ix_books_title_trgm ON books USING gin (title gin_trgm_ops)",
+    ],
+    UserModel.__table__: [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_users_name_trgm ON users USING gin (name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_users_email_trgm ON users USING gin (email gin_trgm_ops)",
+    ],
+}
+
+
+def create_search_indexes(connection):
+    """Create the full-text and trigram indexes behind Postgres book and patron search"""
+
+    for statements in SEARCH_INDEX_DDL.values():
+        for statement in statements:
+            connection.execute(statement)
+
+
+for table, statements in SEARCH_INDEX_DDL.items():
+    for statement in statements:
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+
+def tokenize(text):
+    """Lowercase word tokens, plus the ISBN-style text with separators removed"""
+
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) > 1:
+        tokens.append("".join(tokens))
+    return tokens
+
+
+class BookSearchIndex:
+    """In-process inverted index over book titles and ISBNs
+
+    Used where the database has no full-text search (SQLite, tests). Built
+    from the books table on first use and kept current from committed
+    BookModel changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+            self._tokens = []
+            self._documents = {}
+
+    def _build(self):
+        self._postings = {}
+        self._documents = {}
+        rows = db.session.query(BookModel.id, BookModel.title, BookModel.isbn).yield_per(1000)
+        for book_id, title, isbn in rows:
+            self._add(book_id, title, isbn, keep_sorted=False)
+        self._tokens = sorted(self._postings)
+
+    def _add(self, book_id, title, isbn, keep_sorted=True):
+        tokens = set(tokenize(title)) | set(tokenize(isbn))
+        self._documents[book_id] = tokens
+        for token in tokens:
+            if token not in self._postings:
+                self._postings[token] = set()
+                if keep_sorted:
+                    bisect.insort(self._tokens, token)
+            self._postings[token].add(book_id)
+
+    def _remove(self, book_id):
+        for token in self._documents.pop(book_id, ()):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.discard(book_id)
+                if not postings:
+                    del self._postings[token]
+                    del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def apply(self, changes):
+        """Apply committed (book_id, title, isbn) changes, title None meaning deleted"""
+
+        with self._lock:
+            if self._postings is None:
+                return
+            for book_id, title, isbn in changes:
+                self._remove(book_id)
+                if title is not None:
+                    self._add(book_id, title, isbn)
+
+    def search(self, query, count):
+        """Answer the best count book ids, exact token matches beating prefixes"""
+
+        with self._lock:
+            if self._postings is None:
+                self._build()
+            scores = {}
+            for term in set(tokenize(query)):
+                matched = {}
+                for index in range(bisect.bisect_left(self._tokens, term), len(self._tokens)):
+                    token = self._tokens[index]
+                    if not token.startswith(term):
+                        break
+                    weight = 2 if token == term else 1
+                    for book_id in self._postings[token]:
+                        matched[book_id] = max(matched.get(book_id, 0), weight)
+                for book_id, weight in matched.items():
+                    scores[book_id] = scores.get(book_id, 0) + weight
+        return heapq.nsmallest(count, scores, key=lambda book_id: (-scores[book_id], book_id))
+
+
+search_index = BookSearchIndex()
+
+
+def search_books(query, limit, offset=0):
+    """Search titles and ISBNs with prefix matching, best matches first"""
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        return _search_postgres(query, limit, offset)
+
+    book_ids = search_index.search(query, offset + limit)[offset:]
+    books = {book.id: book for book in BookModel.query.filter(BookModel.id.in_(book_ids))}
+    return [books[book_id] for book_id in book_ids if book_id in books]
+
+
+def _search_postgres(query, limit, offset):
+    terms = TOKEN_PATTERN.findall(query.lower())
+    document = func.to_tsvector("simple", BookModel.title + " " + BookModel.isbn)
+    ts_query = func.to_tsquery("simple", " & ".join(f"{term}:*" for term in terms))
+    rank = func.ts_rank(document, ts_query) + func.similarity(BookModel.title, query)
+    return BookModel.query \
+             .filter(or_(document.op("@@")(ts_query),
+                         BookModel.title.op("%")(query),
+                         BookModel.isbn.startswith(query))) \
+             .order_by(rank.desc(), BookModel.id) \
+             .limit(limit) \
+             .offset(offset) \
+             .all()
+
+
+@event.listens_for(BookModel, "after_insert")
+@event.listens_for(BookModel, "after_update")
+def _book_saved(mapper, connection, target):
+    db.session.info.setdefault("search_changes", []).append((target.id, target.title, target.isbn))
+
+
+@event.listens_for(BookModel, "after_delete")
+def _book_deleted(mapper, connection, target):
+    db.session.info.setdefault("search_changes", []).append((target.id, None, None))
+
+
+@event.listens_for(db.session, "after_commit")
+def _apply_search_changes(session):
+    changes = session.info.pop("search_changes", None)
+    if changes:
+        search_index.apply(changes)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_search_changes(session):
+    session.info.pop("search_changes", None)
@@ -2,9 +2,15 @@
 import jwt
 import os
 import datetime
+import threading
 from flask import json, Response, request, g
+from flask import current_app as app
 from functools import wraps
+from sqlalchemy import event
+from ..models import db
 from ..models.UserModel import UserModel
+from .Cache import TTLCache
+from .Identity import Identity
 
 
 '''
@@ -12,18 +18,62 @@ Siin failis on mitmel korral välja kutsutud Response tagastamine,kus mitmed par
 eraldi meetodisse
 '''
 
+# Process-wide cache of user id -> current token version, read by stateless
+# auth; its TTL bounds how long another worker's revocation goes unnoticed
+token_version_cache = TTLCache(maxsize=0)
+
+
+class TokenDenylist:
+    """In-memory denylist of revoked token versions, keyed by user id
+
+    Revocations committed by this process apply at once. Other processes
+    (and this one after a restart) learn about them from users.token_version,
+    see Auth.current_token_version.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._min_versions = {}
+
+    def revoke(self, user_id, version):
+        """Reject the user's tokens issued with a version below version"""
+        with self._lock:
+            if version > self._min_versions.get(user_id, 0):
+                self._min_versions[user_id] = version
+
+    def is_revoked(self, user_id, version):
+        return (version or 0) < self._min_versions.get(user_id, 0)
+
+    def clear(self):
+        with self._lock:
+            self._min_versions.clear()
+
+
 class Auth:
     """Auth Class"""
 
+    denylist = TokenDenylist()
+
     @staticmethod
-    def generate_token(user_id):
-        """Generate Token"""
+    def generate_token(user_id, roles=None, version=None):
+        """Generate Token
+
+        With JWT_STATELESS enabled the roles and token version are signed
+        into the token, so auth_required can skip the user lookup, and the
+        token expires after JWT_STATELESS_EXPIRY_MINUTES instead of a day.
+        """
         try:
+            lifetime = datetime.timedelta(days=1)
+            if roles is not None and app.config.get("JWT_STATELESS"):
+                lifetime = datetime.timedelta(minutes=app.config.get("JWT_STATELESS_EXPIRY_MINUTES", 60))
             payload = {
-                "exp": datetime.datetime.utcnow() + datetime.timedelta(days=1),
+                "exp": datetime.datetime.utcnow() + lifetime,
                 "iat": datetime.datetime.utcnow(),
                 "sub": user_id,
             }
+            if roles is not None and app.config.get("JWT_STATELESS"):
+                payload["roles"] = sorted(roles)
+                payload["ver"] = version or 0
             return jwt.encode(payload, os.getenv("JWT_SECRET_KEY"), "HS256") \
                       .decode("utf-8")
         except Exception as e:
@@ -33,13 +83,30 @@ class Auth:
                 status=400,
             )
 
+    @staticmethod
+    def current_token_version(user_id):
+        """The user's token version, cached for TOKEN_VERSION_CACHE_TTL seconds
+
+        None when the user does not exist.
+        """
+        version = token_version_cache.get(user_id)
+        if version is None:
+            version = db.session.query(UserModel.token_version).filter(UserModel.id == user_id).scalar()
+            if version is not None:
+                token_version_cache.set(user_id, version)
+        return version
+
     @staticmethod
     def decode_token(token):
         """Decode token"""
         re = {"data": {}, "error": {}}
         try:
             payload = jwt.decode(token, os.getenv("JWT_SECRET_KEY"))
-            re["data"] = {"user_id": payload["sub"]}
+            re["data"] = {
+                "user_id": payload["sub"],
+                "roles": payload.get("roles"),
+                "version": payload.get("ver"),
+            }
             return re
         except jwt.ExpiredSignatureError as e1:
             re["error"] = {"message": "token expired, please login again"}
@@ -82,8 +149,30 @@ class Auth:
                 )
 
             user_id = data["data"]["user_id"]
-            check_user = UserModel.get_one_user(user_id)
-            if not check_user:
+            roles = data["data"]["roles"]
+            if roles is not None and app.config.get("JWT_STATELESS"):
+                version = data["data"]["version"] or 0
+                current = Auth.current_token_version(user_id)
+                if current is None:
+                    return Response(
+                        mimetype="application/json",
+                        response=json.dumps(
+                            {"error": "user does not exist, invalid token"}
+                        ),
+                        status=400,
+                    )
+                if Auth.denylist.is_revoked(user_id, version) or version < current:
+                    return Response(
+                        mimetype="application/json",
+                        response=json.dumps(
+                            {"message": "token revoked, please login again"}
+                        ),
+                        status=400,
+                    )
+                identity = Identity(user_id, roles)
+            else:
+                identity = Identity.load(user_id)
+            if not identity:
                 return Response(
                     mimetype="application/json",
                     response=json.dumps(
@@ -92,6 +181,25 @@ class Auth:
                     status=400,
                 )
             g.user = {"id": user_id}
+            g.identity = identity
             return func(*args, **kwargs)
 
         return decorated_auth
+
+
+@event.listens_for(UserModel.token_version, "set")
+def _token_version_changed(target, value, oldvalue, initiator):
+    if target.id is not None and value:
+        db.session.info.setdefault("revoked_tokens", {})[target.id] = value
+
+
+@event.listens_for(db.session, "after_commit")
+def _apply_revocations(session):
+    for user_id, version in session.info.pop("revoked_tokens", {}).items():
+        Auth.denylist.revoke(user_id, version)
+        token_version_cache.delete(user_id)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_revocations(session):
+    session.info.pop("revoked_tokens", None)
@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds
+
+    A maxsize of 0 disables the cache, a ttl of None keeps entries until
+    they are evicted or invalidated.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self.configure(maxsize, ttl)
+
+    def configure(self, maxsize, ttl=None):
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._data.clear()
+
+    def init_app(self, app, prefix):
+        """Configure from the <prefix>_SIZE and <prefix>_TTL settings
+
+        A TTL of 0 disables the cache.
+        """
+        ttl = app.config.get(f"{prefix}_TTL", 0)
+        self.configure(app.config.get(f"{prefix}_SIZE", 1024) if ttl else 0, ttl)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if not self.maxsize:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,129 @@
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from ..models import bcrypt
+
+
+class HashingBusy(Exception):
+    """Raised when the password hashing queue is full"""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded worker pool instead of the request thread
+
+    At most workers hashes run at once and queue_size more may wait; any
+    further request is rejected with HashingBusy rather than piling up.
+    bcrypt releases the GIL, so the workers hash in parallel.
+    """
+
+    def __init__(self, workers=4, queue_size=32, rounds=10):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._latencies = deque(maxlen=1024)
+        self.configure(workers, queue_size, rounds)
+
+    def configure(self, workers, queue_size, rounds=None):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self.workers = workers
+            self.queue_size = queue_size
+            if rounds is not None:
+                self.rounds = rounds
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+            self._slots = threading.BoundedSemaphore(workers + queue_size)
+            self._in_flight = 0
+            self._rejected = 0
+            self._completed = 0
+            self._latencies.clear()
+
+    def init_app(self, app):
+        self.configure(
+            app.config.get("PASSWORD_HASH_WORKERS", 4),
+            app.config.get("PASSWORD_HASH_QUEUE_SIZE", 32),
+            app.config.get("BCRYPT_LOG_ROUNDS", 10),
+        )
+
+    def generate(self, password):
+        return self._run(bcrypt.generate_password_hash, password, self.rounds).decode("utf-8")
+
+    def needs_rehash(self, pw_hash):
+        """Check if a stored hash was made with another cost than the configured one"""
+
+        try:
+            return int(pw_hash.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def check(self, pw_hash, password):
+        return self._run(bcrypt.check_password_hash, pw_hash, password)
+
+    def _run(self, func, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingBusy()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            start = time.perf_counter()
+            return self._executor.submit(func, *args).result()
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                self._latencies.append(elapsed)
+            slots.release()
+
+    def stats(self):
+        """Queue depth and latency (queue wait included) of recent hashes"""
+
+        with self._lock:
+            latencies = sorted(self._latencies)
+            in_flight = self._in_flight
+            stats = {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": in_flight,
+                "queued": max(0, in_flight - self.workers),
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+        if latencies:
+            stats["latency_ms"] = {
+                "p50": latencies[len(latencies) // 2],
+                "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                "max": latencies[-1],
+            }
+        return stats
+
+
+password_hasher = PasswordHasher()
+
+
+def calibrate(target_ms, samples=3, min_rounds=4, max_rounds=16):
+    """Time bcrypt on this machine and suggest the highest cost within target_ms
+
+    Answers the suggested rounds (min_rounds when even that is too slow)
+    and the median milliseconds measured per cost. Stops once a cost takes
+    more than twice the target.
+    """
+
+    timings = {}
+    suggested = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        runs = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            bcrypt.generate_password_hash("calibration-password", rounds)
+            runs.append((time.perf_counter() - start) * 1000)
+        timings[rounds] = statistics.median(runs)
+        if timings[rounds] <= target_ms:
+            suggested = rounds
+        if timings[rounds] > 2 * target_ms:
+            break
+    return suggested, timings
@@ -0,0 +1,67 @@
+from sqlalchemy import event
+from ..models import db
+from ..models.UserModel import UserModel, UserRoles
+from .Cache import TTLCache
+
+
+# Process-wide cache of user id -> frozenset of role names
+role_cache = TTLCache(maxsize=0)
+
+
+class Identity:
+    """The authenticated user of the current request"""
+
+    def __init__(self, user_id, roles):
+        self.id = user_id
+        self.roles = frozenset(roles)
+
+    def has_any_role(self, required_roles):
+        return not self.roles.isdisjoint(required_roles)
+
+    @staticmethod
+    def load(user_id):
+        """Load the user and its roles in one query, or from the role cache"""
+
+        roles = role_cache.get(user_id)
+        if roles is None:
+            user = UserModel.get_user_with_roles(user_id)
+            if not user:
+                return None
+            roles = frozenset(role.name for role in user.roles)
+            role_cache.set(user_id, roles)
+        return Identity(user_id, roles)
+
+
+def _invalidate_user(user_id):
+    if user_id is not None:
+        role_cache.delete(user_id)
+        db.session.info.setdefault("role_cache_dirty", set()).add(user_id)
+
+
+@event.listens_for(UserModel.roles, "append")
+@event.listens_for(UserModel.roles, "remove")
+def _user_roles_changed(target, value, initiator):
+    if target.id is not None and target.id not in db.session.info.get("role_cache_dirty", ()):
+        target.revoke_tokens()
+    _invalidate_user(target.id)
+
+
+@event.listens_for(UserRoles, "after_insert")
+@event.listens_for(UserRoles, "after_update")
+@event.listens_for(UserRoles, "after_delete")
+def _user_role_row_changed(mapper, connection, target):
+    _invalidate_user(target.user_id)
+
+
+@event.listens_for(UserModel, "after_delete")
+def _user_deleted(mapper, connection, target):
+    _invalidate_user(target.id)
+
+
+@event.listens_for(db.session, "after_commit")
+@event.listens_for(db.session, "after_rollback")
+def _flush_role_cache(session):
+    """Drop entries cached by other requests while the change was in flight"""
+
+    for user_id in session.info.pop("role_cache_dirty", ()):
+        role_cache.delete(user_id)
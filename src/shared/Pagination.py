@@ -0,0 +1,103 @@
+import csv
+import io
+from flask import request, Response, stream_with_context
+from .Serialization import dumps
+
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+STREAM_CHUNK_SIZE = 500
+
+
+def get_int_arg(name, default=None):
+    """Read an integer query string argument, ValueError when it is not one"""
+
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+def get_page_args():
+    """Read keyset pagination arguments (after_id, limit) from the query string
+
+    Raises ValueError for values that are not integers.
+    """
+
+    after_id = get_int_arg("after_id")
+    limit = get_int_arg("limit", DEFAULT_PAGE_LIMIT)
+    if limit < 1:
+        limit = DEFAULT_PAGE_LIMIT
+    return after_id, min(limit, MAX_PAGE_LIMIT)
+
+
+def wants_stream():
+    """Check if the client asked for a streamed response"""
+
+    return request.args.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def set_next_cursor(response, rows, limit):
+    """Point the client to the next page when the current one is full"""
+
+    if rows and len(rows) == limit:
+        response.headers["X-Next-After-Id"] = str(rows[-1].id)
+    return response
+
+
+def stream_json_array(rows, dump, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield a JSON array in chunks of chunk_size serialized rows"""
+
+    yield b"["
+    first = True
+    chunk = []
+    for row in rows:
+        chunk.append(dump(row))
+        if len(chunk) >= chunk_size:
+            yield (b"" if first else b",") + dumps(chunk)[1:-1]
+            first = False
+            chunk = []
+    if chunk:
+        yield (b"" if first else b",") + dumps(chunk)[1:-1]
+    yield b"]"
+
+
+def stream_response(rows, dump, chunk_size=STREAM_CHUNK_SIZE):
+    """Stream rows as a JSON array without building the whole body in memory"""
+
+    return Response(
+        stream_with_context(stream_json_array(rows, dump, chunk_size)),
+        mimetype="application/json",
+        status=200,
+    )
+
+
+def stream_ndjson(rows, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield one JSON document per line, chunk_size rows at a time"""
+
+    chunk = []
+    for row in rows:
+        chunk.append(dumps(row))
+        if len(chunk) >= chunk_size:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def stream_csv(rows, fields, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield CSV text with a header line, chunk_size rows at a time"""
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for index, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if index % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
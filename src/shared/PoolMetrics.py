@@ -0,0 +1,70 @@
+import bisect
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+# Upper bounds (milliseconds) of the checkout wait histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool recording how long callers wait for a connection
+
+    The wait covers queueing for a free connection as well as opening a new
+    one. Counters start over when the engine recreates its pool (dispose).
+    """
+
+    def __init__(self, *args, **kwargs):
+        QueuePool.__init__(self, *args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self._wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self._timeouts = 0
+        self._peak_checked_out = 0
+        self._peak_overflow = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = QueuePool._do_get(self)
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self._timeouts += 1
+            raise
+        waited = (time.perf_counter() - start) * 1000
+        with self._metrics_lock:
+            self._wait_counts[bisect.bisect_left(WAIT_BUCKETS_MS, waited)] += 1
+            self._peak_checked_out = max(self._peak_checked_out, self.checkedout())
+            self._peak_overflow = max(self._peak_overflow, self.overflow())
+        return connection
+
+    def stats(self):
+        with self._metrics_lock:
+            counts = list(self._wait_counts)
+            timeouts = self._timeouts
+            peak_checked_out = self._peak_checked_out
+            peak_overflow = self._peak_overflow
+        histogram = {str(bound): count for bound, count in zip(WAIT_BUCKETS_MS, counts)}
+        histogram["+Inf"] = counts[-1]
+        return {
+            "pool": type(self).__name__,
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(0, self.overflow()),
+            "peak_checked_out": peak_checked_out,
+            "peak_overflow": max(0, peak_overflow),
+            "checkouts": sum(counts),
+            "timeouts": timeouts,
+            "wait_ms_histogram": histogram,
+        }
+
+
+def pool_stats(pool):
+    """Metrics of an instrumented pool, the status line of any other pool"""
+
+    if isinstance(pool, InstrumentedQueuePool):
+        return pool.stats()
+    return {"pool": type(pool).__name__, "status": pool.status()}
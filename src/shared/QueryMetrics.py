@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# The start time lives on the statement's execution context, which is
+# discarded with the statement whether it succeeds or fails
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    if has_request_context():
+        log = g.get("query_log")
+        if log is not None:
+            log.append((statement, elapsed))
+
+
+class QueryMetrics:
+    """Opt-in per-request query counting (QUERY_METRICS)
+
+    Counts the statements and database time of every request, reports them
+    in a Server-Timing header and aggregates them per endpoint. Requests
+    running more than QUERY_METRICS_MAX_QUERIES statements, spending more
+    than QUERY_METRICS_MAX_DB_MS in the database or repeating a statement
+    QUERY_METRICS_REPEAT_THRESHOLD times (the N+1 pattern) are logged.
+    Queries run while a streamed body is sent are not counted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._listening = False
+
+    def init_app(self, app):
+        with self._lock:
+            self._endpoints = {}
+            if not app.config.get("QUERY_METRICS"):
+                return
+            if not self._listening:
+                event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+                event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+                self._listening = True
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.query_log = []
+
+    def _finish(self, response):
+        log = g.pop("query_log", None)
+        if log is None:
+            return response
+
+        config = current_app.config
+        count = len(log)
+        db_ms = sum(elapsed for _, elapsed in log) * 1000
+        repeated = {statement: times for statement, times in Counter(statement for statement, _ in log).items()
+                    if times >= config.get("QUERY_METRICS_REPEAT_THRESHOLD", 5)}
+        flagged = bool(count > config.get("QUERY_METRICS_MAX_QUERIES", 20)
+                       or db_ms > config.get("QUERY_METRICS_MAX_DB_MS", 100)
+                       or repeated)
+
+        response.headers.add("Server-Timing", f'db;dur={db_ms:.1f};desc="{count} queries"')
+        endpoint = request.endpoint or "unmatched"
+        with self._lock:
+            stats = self._endpoints.setdefault(
+                endpoint, {"requests": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0, "flagged": 0}
+            )
+            stats["requests"] += 1
+            stats["queries"] += count
+            stats["db_ms"] += db_ms
+            stats["max_queries"] = max(stats["max_queries"], count)
+            stats["flagged"] += flagged
+
+        if flagged:
+            current_app.logger.warning(
+                f'Query budget exceeded on {endpoint} ({count} queries, {db_ms:.1f} ms in database)'
+            )
+            for statement, times in repeated.items():
+                current_app.logger.warning(f'Statement repeated {times} times on {endpoint}: {statement[:200]}')
+        return response
+
+    def stats(self):
+        """Per-endpoint totals since the app started"""
+
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._endpoints.items()}
+
+
+query_metrics = QueryMetrics()
+
+
+@contextmanager
+def count_queries():
+    """Collect the statements executed in the block, on any engine"""
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "after_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "after_cursor_execute", record)
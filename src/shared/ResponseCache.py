@@ -0,0 +1,144 @@
+import hashlib
+import json
+import threading
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, request, Response
+from .Cache import TTLCache
+from ..models import db
+
+
+CACHED_HEADERS = ("X-Next-After-Id",)
+
+
+class MemoryBackend:
+    """In-process LRU backend, every worker keeps its own entries"""
+
+    def __init__(self, maxsize, ttl):
+        self._entries = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        self._generations = {}
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, entry):
+        self._entries.set(key, entry)
+
+    def generation(self, namespace):
+        return self._generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+
+class RedisBackend:
+    """Redis (or compatible) backend shared by all workers, needs the redis package
+
+    Redis errors are logged and treated as misses: generation() answers
+    None, which makes the cache step aside, and writes are dropped.
+    """
+
+    def __init__(self, url, ttl):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._errors = redis.RedisError
+        self._ttl = ttl
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            return getattr(self._client, method)(*args, **kwargs)
+        except self._errors as err:
+            current_app.logger.warning(f'Response cache unavailable, serving uncached ({err})')
+            return None
+
+    def get(self, key):
+        value = self._call("get", f"response-cache:{key}")
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, entry):
+        self._call("set", f"response-cache:{key}", json.dumps(entry), ex=self._ttl or None)
+
+    def generation(self, namespace):
+        try:
+            return int(self._client.get(f"response-cache:{namespace}:generation") or 0)
+        except self._errors as err:
+            current_app.logger.warning(f'Response cache unavailable, serving uncached ({err})')
+            return None
+
+    def bump(self, namespace):
+        self._call("incr", f"response-cache:{namespace}:generation")
+
+
+class ResponseCache:
+    """Caches JSON GET responses by route and query string, with ETag revalidation
+
+    Every namespace carries a generation number that is part of the cache
+    key; invalidating a namespace bumps it, which drops all of its entries
+    at once. Misses are answered from the primary database: a lagging
+    replica would store its pre-write page under the new generation.
+    """
+
+    def __init__(self):
+        self.backend = None
+
+    def init_app(self, app):
+        backend = app.config.get("RESPONSE_CACHE_BACKEND", "memory")
+        ttl = app.config.get("RESPONSE_CACHE_TTL", 60)
+        if backend == "redis":
+            self.backend = RedisBackend(app.config["RESPONSE_CACHE_REDIS_URL"], ttl)
+        elif backend == "memory":
+            self.backend = MemoryBackend(app.config.get("RESPONSE_CACHE_SIZE", 1024), ttl)
+        else:
+            self.backend = None
+
+    def invalidate(self, namespace):
+        if self.backend is not None:
+            self.backend.bump(namespace)
+
+    def cached(self, namespace):
+        """Decorator for GET views returning JSON"""
+
+        def decorator(func):
+            @wraps(func)
+            def decorated(*args, **kwargs):
+                if self.backend is None:
+                    return func(*args, **kwargs)
+
+                generation = self.backend.generation(namespace)
+                if generation is None:
+                    return func(*args, **kwargs)
+                args_key = urlencode(sorted(request.args.items(multi=True)))
+                key = f"{namespace}:{generation}:{request.path}?{args_key}"
+                entry = self.backend.get(key)
+                if entry is None:
+                    with db.session().use_primary():
+                        response = func(*args, **kwargs)
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    body = response.get_data(as_text=True)
+                    entry = {
+                        "body": body,
+                        "etag": hashlib.sha1(body.encode("utf-8")).hexdigest(),
+                        "headers": {name: response.headers[name]
+                                    for name in CACHED_HEADERS if name in response.headers},
+                    }
+                    self.backend.set(key, entry)
+
+                if request.if_none_match.contains(entry["etag"]):
+                    response = Response(status=304)
+                else:
+                    response = Response(mimetype="application/json", response=entry["body"], status=200)
+                    response.headers.extend(entry["headers"])
+                response.set_etag(entry["etag"])
+                response.headers["Cache-Control"] = "no-cache"
+                return response
+
+            return decorated
+
+        return decorator
+
+
+response_cache = ResponseCache()
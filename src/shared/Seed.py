@@ -0,0 +1,74 @@
+import datetime
+from ..models import db
+from ..models.UserModel import UserModel, Role, UserRoles
+
+
+ROLE_NAMES = ["Admin", "Librarian", "Patron"]
+
+SAMPLE_USERS = [
+    {
+        "role": "Admin",
+        "data": {"name": "Ben White", "email": "ben@test.com", "password": "testpass123"}
+    },
+    {
+        "role": "Librarian",
+        "data": {"name": "Sarah Smith", "email": "sarah@test.com", "password": "testpass123"}
+    },
+    {
+        "role": "Patron",
+        "data": {"name": "Jessica Parker", "email": "jess@test.com", "password": "testpass123"}
+    },
+    {
+        "role": "Patron",
+        "data": {"name": "Angelina Jolie", "email": "angie@test.com", "password": "testpass123"}
+    }
+]
+
+
+def seed_database(sample_users=False):
+    """Insert the roles and optionally the sample users, skipping existing rows
+
+    Safe to run any number of times. Returns the number of inserted roles
+    and users.
+    """
+
+    existing_roles = {name for (name,) in db.session.query(Role.name)}
+    new_roles = [{"name": name} for name in ROLE_NAMES if name not in existing_roles]
+    if new_roles:
+        db.session.bulk_insert_mappings(Role, new_roles)
+
+    new_users = []
+    if sample_users:
+        emails = [user["data"]["email"] for user in SAMPLE_USERS]
+        existing_emails = {
+            email for (email,) in
+            db.session.query(UserModel.email).filter(UserModel.email.in_(emails))
+        }
+        new_users = [user for user in SAMPLE_USERS if user["data"]["email"] not in existing_emails]
+
+    if new_users:
+        now = datetime.datetime.utcnow()
+        db.session.bulk_insert_mappings(UserModel, [
+            {
+                "name": user["data"]["name"],
+                "email": user["data"]["email"],
+                "password": UserModel.hash_password(user["data"]["password"]),
+                "token_version": 0,
+                "created_at": now,
+                "modified_at": now,
+            }
+            for user in new_users
+        ])
+
+        user_ids = dict(
+            db.session.query(UserModel.email, UserModel.id)
+            .filter(UserModel.email.in_([user["data"]["email"] for user in new_users]))
+        )
+        role_ids = dict(db.session.query(Role.name, Role.id))
+        db.session.bulk_insert_mappings(UserRoles, [
+            {"user_id": user_ids[user["data"]["email"]], "role_id": role_ids[user["role"]]}
+            for user in new_users
+        ])
+
+    db.session.commit()
+    return len(new_roles), len(new_users)
@@ -1,9 +1,24 @@
 import unittest
 import os
 import json
-from ..app import create_app, db
+import datetime
+import sqlite3
+from ..app import create_app, db, bcrypt
 import marshmallow
 from ..models.UserModel import UserModel, UserSchema, Role
+from ..models.BookModel import BookModel, BookIssueModel
+from sqlalchemy.exc import IntegrityError, TimeoutError
+from ..shared.Identity import Identity, role_cache
+from ..shared.Authentication import Auth, token_version_cache
+from ..shared.Seed import seed_database
+from ..shared.Hashing import password_hasher
+from ..shared.PoolMetrics import InstrumentedQueuePool
+from ..shared.QueryMetrics import count_queries
+from ..shared.ResponseCache import RedisBackend, response_cache
+from ..shared.Serialization import compile_dumper
+from ..models.BookModel import BookSchema, BookIssueSchema
+from ..dao.BookDao import BookDao
+from ..services import IssueService
 
 class ModelTest(unittest.TestCase):
     """Test case"""
@@ -20,6 +35,24 @@ class ModelTest(unittest.TestCase):
             data=json.dumps(user_data)
         )
 
+    def add_book(self, book_data, token):
+        """Add a sample book"""
+        return self.client().post(
+            "/api/v1/books/",
+            headers={"Content-Type": "application/json", "Authorization": f"Token {token}"},
+            data=json.dumps(book_data)
+        )
+
+    def assertMaxQueries(self, max_queries, method, url, token, data=None):
+        """Request url and assert it ran at most max_queries statements"""
+        with count_queries() as statements:
+            res = self.client().open(
+                url, method=method, data=data,
+                headers={"Content-Type": "application/json", "Authorization": f"Token {token}"}
+            )
+        self.assertLessEqual(len(statements), max_queries, "\n".join(statements))
+        return res
+
     def login_as_admin(self):
         res = self.client().post(
             "/api/v1/users/login/",
@@ -71,6 +104,7 @@ class ModelTest(unittest.TestCase):
 
         self.app = create_app("testing")
         self.client = self.app.test_client
+        Auth.denylist.clear()
 
         with self.app.app_context():
             db.drop_all()
@@ -166,6 +200,55 @@ class ModelTest(unittest.TestCase):
         number_of_matching_by_name = len(json.loads(res.data))
         self.assertEqual(number_of_matching_by_name, 1)
 
+    def test_patron_search_is_paginated(self):
+        """Test patron search is case-insensitive, escapes wildcards and pages by id"""
+        admin_token = self.login_as_admin()
+        for name in ("Jane Doe", "John Doe", "Jim Beam"):
+            email = name.lower().replace(" ", ".") + "@mail.com"
+            self.create_user({"name": name, "email": email, "password": "testpass"}, admin_token)
+        headers = {"Content-Type": "application/json", "Authorization": f"Token {admin_token}"}
+
+        res = self.client().get("/api/v1/users/patrons/?query=doe&limit=1", headers=headers)
+        self.assertEqual([user["name"] for user in json.loads(res.data)], ["Jane Doe"])
+        after_id = res.headers.get("X-Next-After-Id")
+
+        res = self.client().get(f"/api/v1/users/patrons/?query=doe&limit=1&after_id={after_id}", headers=headers)
+        self.assertEqual([user["name"] for user in json.loads(res.data)], ["John Doe"])
+
+        res = self.client().get("/api/v1/users/patrons/?query=%25", headers=headers)
+        self.assertEqual(json.loads(res.data), [])
+
+    def test_login_is_rejected_when_hashing_queue_is_full(self):
+        """Test login sheds load with 503 when every hashing slot is taken"""
+        password_hasher.configure(workers=1, queue_size=0)
+        password_hasher._slots.acquire()
+        try:
+            res = self.client().post(
+                "/api/v1/users/login/",
+                headers={"Content-Type": "application/json"},
+                data=json.dumps({"email": "admin@test.com", "password": "testpass123"})
+            )
+        finally:
+            password_hasher._slots.release()
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(password_hasher.stats()["rejected"], 1)
+        self.assertTrue(self.login_as_admin())
+
+    def test_password_is_rehashed_on_login_when_cost_changes(self):
+        """Test a stored hash is upgraded to the configured cost on login"""
+        with self.app.app_context():
+            admin = UserModel.get_user_by_email("admin@test.com")
+            admin.password = bcrypt.generate_password_hash("testpass123", 5).decode("utf-8")
+            db.session.commit()
+
+        self.assertTrue(self.login_as_admin())
+
+        with self.app.app_context():
+            admin = UserModel.get_user_by_email("admin@test.com")
+            self.assertFalse(password_hasher.needs_rehash(admin.password))
+            self.assertTrue(admin.check_hash("testpass123"))
+
     def test_admin_adds_a_book(self):
         """Test an admin can add a book"""
         token = self.login_as_admin()
@@ -216,6 +299,498 @@ class ModelTest(unittest.TestCase):
         res = self.client().get("/api/v1/books/")
         self.assertEqual(res.status_code, 200)
 
+    def test_books_are_paginated_by_id(self):
+        """Test the book list is returned in keyset pages"""
+        token = self.login_as_admin()
+        for i in range(3):
+            self.add_book({"isbn": f"isbn-{i}", "title": f"Book {i}", "location": "AC-132"}, token)
+
+        res = self.client().get("/api/v1/books/?limit=2")
+        first_page = json.loads(res.data)
+        self.assertEqual(len(first_page), 2)
+        after_id = res.headers.get("X-Next-After-Id")
+        self.assertEqual(int(after_id), first_page[-1]["id"])
+
+        res = self.client().get(f"/api/v1/books/?limit=2&after_id={after_id}")
+        second_page = json.loads(res.data)
+        self.assertEqual([book["title"] for book in second_page], ["Book 2"])
+        self.assertIsNone(res.headers.get("X-Next-After-Id"))
+
+        for query in ("limit=two", "after_id=2x"):
+            res = self.client().get(f"/api/v1/books/?{query}")
+            self.assertEqual(res.status_code, 400)
+
+    def test_books_are_streamed(self):
+        """Test the whole catalog can be streamed as one JSON array"""
+        token = self.login_as_admin()
+        for i in range(3):
+            self.add_book({"isbn": f"isbn-{i}", "title": f"Book {i}", "location": "AC-132"}, token)
+
+        res = self.client().get("/api/v1/books/?stream=1")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([book["title"] for book in json.loads(res.data)], ["Book 0", "Book 1", "Book 2"])
+
+    def test_role_cache_invalidated_on_role_change(self):
+        """Test cached roles are dropped when the user's roles change"""
+        role_cache.configure(maxsize=16, ttl=60)
+        try:
+            with self.app.app_context():
+                librarian = UserModel.get_user_by_email("librarian@test.com")
+                self.assertTrue(Identity.load(librarian.id).has_any_role(["Librarian"]))
+                self.assertIsNotNone(role_cache.get(librarian.id))
+
+                librarian.roles = [Role.query.filter_by(name="Admin").first()]
+                db.session.commit()
+
+                self.assertIsNone(role_cache.get(librarian.id))
+                identity = Identity.load(librarian.id)
+                self.assertTrue(identity.has_any_role(["Admin"]))
+                self.assertFalse(identity.has_any_role(["Librarian"]))
+        finally:
+            role_cache.configure(maxsize=0)
+
+    def test_stateless_token_is_revoked_on_role_change(self):
+        """Test stateless tokens carry roles and stop working once revoked"""
+        self.app.config["JWT_STATELESS"] = True
+        token = self.login_as_librarian()
+        self.assertEqual(Auth.decode_token(token)["data"]["roles"], ["Librarian"])
+
+        res = self.client().get("/api/v1/issues/", headers={"Authorization": f"Token {token}"})
+        self.assertEqual(res.status_code, 200)
+
+        with self.app.app_context():
+            librarian = UserModel.get_user_by_email("librarian@test.com")
+            librarian.roles = [Role.query.filter_by(name="Patron").first()]
+            db.session.commit()
+
+        res = self.client().get("/api/v1/issues/", headers={"Authorization": f"Token {token}"})
+        self.assertEqual(res.status_code, 400)
+
+        # Another worker (or a restart) never saw the revocation in memory
+        Auth.denylist.clear()
+        token_version_cache.clear()
+        res = self.client().get("/api/v1/issues/", headers={"Authorization": f"Token {token}"})
+        self.assertEqual(res.status_code, 400)
+
+    def test_seeding_is_idempotent(self):
+        """Test seeding only inserts missing roles and users"""
+        with self.app.app_context():
+            self.assertEqual(seed_database(sample_users=True), (0, 4))
+            self.assertEqual(seed_database(sample_users=True), (0, 0))
+            self.assertEqual(Role.query.count(), 3)
+            ben = UserModel.get_user_by_email("ben@test.com")
+            self.assertEqual([role.name for role in ben.roles], ["Admin"])
+            self.assertTrue(ben.check_hash("testpass123"))
+
+    def test_copy_count_follows_added_and_deleted_books(self):
+        """Test cached per-ISBN copy counts are invalidated on save and delete"""
+        with self.app.app_context():
+            book_data = {"isbn": "99921-58-10-7", "title": "Garry Potter", "location": "AC-132"}
+            BookModel(book_data).save()
+            self.assertEqual(BookModel.count_copies("99921-58-10-7"), 1)
+
+            copy = BookModel(book_data)
+            copy.save()
+            self.assertEqual(BookModel.count_copies("99921-58-10-7"), 2)
+
+            copy.delete()
+            self.assertEqual(BookModel.count_copies("99921-58-10-7"), 1)
+
+    def test_admin_imports_books_in_batches(self):
+        """Test bulk import inserts valid rows and reports invalid ones"""
+        token = self.login_as_admin()
+        rows = [
+            {"isbn": "isbn-1", "title": "Book 1", "location": "AC-132"},
+            {"isbn": "isbn-2", "title": "Book 2"},
+            {"isbn": "isbn-3", "title": "Book 3", "location": "AC-133"},
+        ]
+
+        res = self.client().post(
+            "/api/v1/books/import?chunk_size=2",
+            headers={"Content-Type": "application/x-ndjson", "Authorization": f"Token {token}"},
+            data="\n".join(json.dumps(row) for row in rows) + "\nnot json\n"
+        )
+
+        result = json.loads(res.data)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(result["imported"], 2)
+        self.assertEqual([error["row"] for error in result["errors"]], [2, 4])
+        self.assertEqual(len(json.loads(self.client().get("/api/v1/books/").data)), 2)
+
+        res = self.client().post(
+            "/api/v1/books/import",
+            headers={"Content-Type": "text/csv", "Authorization": f"Token {token}"},
+            data="isbn,title,location\nisbn-4,Book 4,AC-134\nisbn-5,Book 5,AC-135,extra\n"
+        )
+        result = json.loads(res.data)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(result["imported"], 1)
+        self.assertEqual(result["errors"], [{"row": 2, "errors": {"unexpected columns": ["Unknown field."]}}])
+
+    def test_only_one_active_issue_per_book(self):
+        """Test the database rejects a second active issue of a book"""
+        with self.app.app_context():
+            book = BookModel({"isbn": "99921-58-10-7", "title": "Garry Potter", "location": "AC-132"})
+            book.save()
+            patron_id = UserModel.get_user_by_email("librarian@test.com").id
+
+            BookIssueModel({"book_id": book.id, "patron_id": patron_id}).save()
+            with self.assertRaises(IntegrityError):
+                BookIssueModel({"book_id": book.id, "patron_id": patron_id}).save()
+            db.session.rollback()
+
+            BookIssueModel({"book_id": book.id, "patron_id": patron_id, "is_active": False}).save()
+            self.assertTrue(BookIssueModel.is_book_issued(book.id))
+
+    def test_checkout_rejects_issued_book_and_unknown_patron(self):
+        """Test checkout answers 400 for an issued book and 404 for a missing patron"""
+        librarian_token = self.login_as_librarian()
+        admin_token = self.login_as_admin()
+        self.add_book({"isbn": "99921-58-10-7", "title": "Garry Potter", "location": "AC-132"}, admin_token)
+        book_id = json.loads(self.client().get("/api/v1/books/").data)[0]["id"]
+        headers = {"Content-Type": "application/json", "Authorization": f"Token {librarian_token}"}
+
+        res = self.client().post("/api/v1/issues/", headers=headers,
+                                 data=json.dumps({"patron_id": 999, "book_id": book_id}))
+        self.assertEqual(res.status_code, 404)
+
+        with self.app.app_context():
+            patron_id = UserModel.get_user_by_email("admin@test.com").id
+        res = self.client().post("/api/v1/issues/", headers=headers,
+                                 data=json.dumps({"patron_id": patron_id, "book_id": book_id}))
+        self.assertEqual(res.status_code, 201)
+        res = self.client().post("/api/v1/issues/", headers=headers,
+                                 data=json.dumps({"patron_id": patron_id, "book_id": book_id}))
+        self.assertEqual(res.status_code, 400)
+
+    def test_librarian_checks_out_and_returns_a_batch(self):
+        """Test batch checkout and return answer one result per item"""
+        librarian_token = self.login_as_librarian()
+        admin_token = self.login_as_admin()
+        for i in range(2):
+            self.add_book({"isbn": "99921-58-10-7", "title": f"Garry Potter {i}", "location": "AC-132"}, admin_token)
+        book_ids = [book["id"] for book in json.loads(self.client().get("/api/v1/books/").data)]
+        with self.app.app_context():
+            patron_id = UserModel.get_user_by_email("admin@test.com").id
+        headers = {"Content-Type": "application/json", "Authorization": f"Token {librarian_token}"}
+
+        items = [{"book_id": book_id, "patron_id": patron_id} for book_id in book_ids]
+        items += [{"book_id": book_ids[0], "patron_id": patron_id}, {"book_id": 999, "patron_id": patron_id}]
+        res = self.client().post("/api/v1/issues/batch", headers=headers, data=json.dumps({"items": items}))
+        statuses = [result["status"] for result in json.loads(res.data)["results"]]
+        self.assertEqual(statuses, [201, 201, 400, 404])
+
+        self.add_book({"isbn": "99921-58-10-8", "title": "Garry Potter", "location": "AC-132"}, admin_token)
+        items = [{"book_id": 3, "patron_id": patron_id, "is_active": False}]
+        res = self.client().post("/api/v1/issues/batch", headers=headers, data=json.dumps({"items": items}))
+        self.assertEqual(json.loads(res.data)["results"][0]["status"], 400)
+        with self.app.app_context():
+            self.assertIsNone(BookIssueModel.query.filter_by(book_id=3).first())
+
+        res = self.client().post("/api/v1/issues/batch/return", headers=headers,
+                                 data=json.dumps({"book_ids": [True]}))
+        self.assertEqual(res.status_code, 400)
+        res = self.client().post("/api/v1/issues/batch/return", headers=headers,
+                                 data=json.dumps({"book_ids": [book_ids[0], 999, book_ids[0]]}))
+        statuses = [result["status"] for result in json.loads(res.data)["results"]]
+        self.assertEqual(statuses, [200, 404])
+        with self.app.app_context():
+            self.assertFalse(BookIssueModel.is_book_issued(book_ids[0]))
+            self.assertTrue(BookIssueModel.is_book_issued(book_ids[1]))
+
+    def test_overdue_report_is_streamed_as_csv_and_ndjson(self):
+        """Test the overdue report lists only active issues past their due date"""
+        librarian_token = self.login_as_librarian()
+        admin_token = self.login_as_admin()
+        for isbn in ("99921-58-10-7", "99921-58-10-8"):
+            self.add_book({"isbn": isbn, "title": "Garry Potter", "location": "AC-132"}, admin_token)
+        with self.app.app_context():
+            patron_id = UserModel.get_user_by_email("admin@test.com").id
+            for book_id, days in ((1, -3), (2, 5)):
+                issue = BookIssueModel({"book_id": book_id, "patron_id": patron_id})
+                issue.due_date = datetime.datetime.now() + datetime.timedelta(days=days)
+                issue.save()
+        headers = {"Authorization": f"Token {librarian_token}"}
+
+        res = self.client().get("/api/v1/issues/overdue", headers=headers)
+        rows = [json.loads(line) for line in res.data.decode("utf-8").splitlines()]
+        self.assertEqual([(row["book_id"], row["patron_name"], row["days_overdue"]) for row in rows],
+                         [(1, "Admin Ben", 3)])
+
+        res = self.client().get("/api/v1/issues/overdue?format=csv", headers=headers)
+        lines = res.data.decode("utf-8").splitlines()
+        self.assertEqual(res.mimetype, "text/csv")
+        self.assertTrue(lines[0].startswith("issue_id,book_id,isbn,title"))
+        self.assertEqual(len(lines), 2)
+
+    def test_issue_listing_is_filtered_paginated_and_embeds_summaries(self):
+        """Test issue listing filters, keyset pages and embedded book/patron"""
+        librarian_token = self.login_as_librarian()
+        admin_token = self.login_as_admin()
+        for isbn in ("99921-58-10-7", "99921-58-10-8", "99921-58-10-9"):
+            self.add_book({"isbn": isbn, "title": "Garry Potter", "location": "AC-132"}, admin_token)
+        with self.app.app_context():
+            admin_id = UserModel.get_user_by_email("admin@test.com").id
+            librarian_id = UserModel.get_user_by_email("librarian@test.com").id
+            for book_id, patron_id in ((1, admin_id), (2, admin_id), (3, librarian_id)):
+                BookIssueModel({"book_id": book_id, "patron_id": patron_id}).save()
+        headers = {"Authorization": f"Token {librarian_token}"}
+        self.client().put("/api/v1/issues/1", headers=headers)
+
+        def book_ids(query):
+            res = self.client().get(f"/api/v1/issues/?{query}", headers=headers)
+            return [issue["book_id"] for issue in json.loads(res.data)], res
+
+        self.assertEqual(book_ids("")[0], [2, 3])
+        self.assertEqual(book_ids("active=all")[0], [1, 2, 3])
+        self.assertEqual(book_ids("active=false")[0], [1])
+        self.assertEqual(book_ids(f"active=all&patron_id={admin_id}")[0], [1, 2])
+        self.assertEqual(book_ids("book_id=3")[0], [3])
+        self.assertEqual(book_ids("due_before=2000-01-01")[0], [])
+        for query in ("patron_id=abc", "book_id=1.5", "due_after=soon"):
+            self.assertEqual(self.client().get(f"/api/v1/issues/?{query}", headers=headers).status_code, 400)
+
+        ids, res = book_ids("active=all&limit=2")
+        self.assertEqual(ids, [1, 2])
+        after_id = res.headers["X-Next-After-Id"]
+        self.assertEqual(book_ids(f"active=all&limit=2&after_id={after_id}")[0], [3])
+
+        res = self.client().get("/api/v1/issues/?book_id=3&embed=book,patron", headers=headers)
+        issue = json.loads(res.data)[0]
+        self.assertEqual(issue["book"]["isbn"], "99921-58-10-9")
+        self.assertEqual(issue["patron"]["name"], "Librarian Sarah")
+
+    def test_patron_loans_are_counted_and_limited(self):
+        """Test loan counters follow checkouts, returns and overdue recounts"""
+        librarian_token = self.login_as_librarian()
+        admin_token = self.login_as_admin()
+        patron_token = json.loads(self.create_user(
+            {"name": "Jane Doe", "email": "jane.doe@mail.com", "password": "testpass"}, admin_token
+        ).data)["jwt_token"]
+        for isbn in ("99921-58-10-7", "99921-58-10-8", "99921-58-10-9"):
+            self.add_book({"isbn": isbn, "title": "Garry Potter", "location": "AC-132"}, admin_token)
+        with self.app.app_context():
+            patron_id = UserModel.get_user_by_email("jane.doe@mail.com").id
+        self.app.config["LOAN_LIMIT"] = 2
+        headers = {"Content-Type": "application/json", "Authorization": f"Token {librarian_token}"}
+
+        for book_id, status in ((1, 201), (2, 201), (3, 400)):
+            res = self.client().post("/api/v1/issues/", headers=headers,
+                                     data=json.dumps({"book_id": book_id, "patron_id": patron_id}))
+            self.assertEqual(res.status_code, status)
+
+        with self.app.app_context():
+            issue = BookIssueModel.query.filter_by(book_id=1).first()
+            issue.due_date = datetime.datetime.now() - datetime.timedelta(days=1)
+            db.session.commit()
+            IssueService.refresh_loan_counts()
+        res = self.client().get(f"/api/v1/users/patrons/{patron_id}/issues",
+                                headers={"Authorization": f"Token {patron_token}"})
+        data = json.loads(res.data)
+        self.assertEqual((data["loans"]["active"], data["loans"]["total"], data["loans"]["overdue"]), (2, 2, 1))
+        self.assertEqual([issue["book"]["id"] for issue in data["issues"]], [1, 2])
+
+        self.client().post("/api/v1/issues/batch/return", headers=headers, data=json.dumps({"book_ids": [1]}))
+        res = self.client().get(f"/api/v1/users/patrons/{patron_id}/issues", headers=headers)
+        data = json.loads(res.data)
+        self.assertEqual((data["loans"]["active"], data["loans"]["total"], data["loans"]["overdue"]), (1, 2, 0))
+        res = self.client().get(f"/api/v1/users/patrons/{patron_id}/issues",
+                                headers={"Authorization": f"Token {self.login_as_admin()}"})
+        self.assertEqual(res.status_code, 200)
+        res = self.client().get(f"/api/v1/users/patrons/1/issues", headers={"Authorization": f"Token {patron_token}"})
+        self.assertEqual(res.status_code, 401)
+
+    def test_availability_is_aggregated_per_isbn_in_one_query(self):
+        """Test availability counts copies per ISBN and follows checkouts and returns"""
+        librarian_token = self.login_as_librarian()
+        admin_token = self.login_as_admin()
+        for i in range(2):
+            self.add_book({"isbn": "99921-58-10-7", "title": f"Garry Potter {i}", "location": "AC-132"}, admin_token)
+        self.add_book({"isbn": "99921-58-10-8", "title": "Garry Potter", "location": "AC-132"}, admin_token)
+        with self.app.app_context():
+            patron_id = UserModel.get_user_by_email("admin@test.com").id
+        headers = {"Content-Type": "application/json", "Authorization": f"Token {librarian_token}"}
+        self.client().post("/api/v1/issues/", headers=headers, data=json.dumps({"book_id": 1, "patron_id": patron_id}))
+
+        with self.app.app_context(), count_queries() as statements:
+            res = self.client().get("/api/v1/books/availability?isbn=99921-58-10-7&isbns=99921-58-10-8,0000")
+        self.assertEqual(len(statements), 1)
+        data = json.loads(res.data)
+        self.assertEqual([(row["isbn"], row["total"], row["available"]) for row in data],
+                         [("99921-58-10-7", 2, 1), ("99921-58-10-8", 1, 1), ("0000", 0, 0)])
+        self.assertIsNotNone(data[0]["next_due_date"])
+        self.assertIsNone(data[1]["next_due_date"])
+
+        self.client().post("/api/v1/issues/batch/return", headers=headers, data=json.dumps({"book_ids": [1]}))
+        data = json.loads(self.client().get("/api/v1/books/availability?isbn=99921-58-10-7").data)
+        self.assertEqual((data[0]["available"], data[0]["next_due_date"]), (2, None))
+        res = self.client().get("/api/v1/books/availability")
+        self.assertEqual(res.status_code, 400)
+
+    def test_librarian_closes_an_issue(self):
+        """Test returning a book deactivates its issue exactly once"""
+        librarian_token = self.login_as_librarian()
+        admin_token = self.login_as_admin()
+        self.add_book({"isbn": "99921-58-10-7", "title": "Garry Potter", "location": "AC-132"}, admin_token)
+        book_id = json.loads(self.client().get("/api/v1/books/").data)[0]["id"]
+        with self.app.app_context():
+            patron_id = UserModel.get_user_by_email("admin@test.com").id
+            issue = BookIssueModel({"book_id": book_id, "patron_id": patron_id})
+            issue.save()
+            issue_id = issue.id
+        headers = {"Content-Type": "application/json", "Authorization": f"Token {librarian_token}"}
+
+        res = self.client().put(f"/api/v1/issues/{issue_id}", headers=headers)
+        self.assertEqual(res.status_code, 200)
+        self.assertFalse(json.loads(res.data)["is_active"])
+        res = self.client().put(f"/api/v1/issues/{issue_id}", headers=headers)
+        self.assertEqual(res.status_code, 400)
+        res = self.client().put("/api/v1/issues/999", headers=headers)
+        self.assertEqual(res.status_code, 404)
+        with self.app.app_context():
+            self.assertFalse(BookIssueModel.is_book_issued(book_id))
+
+    def test_books_are_searched_by_title_and_isbn_prefix(self):
+        """Test search matches prefixes, ranks exact words first and follows deletes"""
+        token = self.login_as_admin()
+        self.add_book({"isbn": "99921-58-10-7", "title": "Garry Potter", "location": "AC-132"}, token)
+        self.add_book({"isbn": "12345-67-89-0", "title": "Potterhead Garry", "location": "AC-133"}, token)
+        self.add_book({"isbn": "55555-55-55-5", "title": "Lord of the Rings", "location": "AC-134"}, token)
+
+        res = self.client().get("/api/v1/books/search?q=pott")
+        self.assertEqual(len(json.loads(res.data)), 2)
+
+        res = self.client().get("/api/v1/books/search?q=potter")
+        self.assertEqual([book["title"] for book in json.loads(res.data)], ["Garry Potter", "Potterhead Garry"])
+
+        res = self.client().get("/api/v1/books/search?q=99921-58")
+        self.assertEqual([book["title"] for book in json.loads(res.data)], ["Garry Potter"])
+
+        with self.app.app_context():
+            BookModel.query.filter_by(title="Garry Potter").first().delete()
+        res = self.client().get("/api/v1/books/search?q=potter")
+        self.assertEqual([book["title"] for book in json.loads(res.data)], ["Potterhead Garry"])
+
+        res = self.client().get("/api/v1/books/search?q=")
+        self.assertEqual(res.status_code, 400)
+
+    def test_book_list_is_cached_with_etag(self):
+        """Test catalog responses revalidate with 304 and are dropped when books change"""
+        token = self.login_as_admin()
+        self.add_book({"isbn": "99921-58-10-7", "title": "Garry Potter", "location": "AC-132"}, token)
+
+        res = self.client().get("/api/v1/books/")
+        etag = res.headers.get("ETag")
+        self.assertTrue(etag)
+
+        res = self.client().get("/api/v1/books/", headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 304)
+
+        self.add_book({"isbn": "99921-58-10-8", "title": "Garry Potter 2", "location": "AC-132"}, token)
+        res = self.client().get("/api/v1/books/", headers={"If-None-Match": etag})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(res.data)), 2)
+
+        self.client().get("/api/v1/books/?after_id=1%26limit%3D1")
+        res = self.client().get("/api/v1/books/?after_id=1&limit=1")
+        self.assertEqual([book["id"] for book in json.loads(res.data)], [2])
+
+    def test_catalog_is_served_uncached_when_redis_is_down(self):
+        """Test an unreachable Redis cache falls back to uncached responses"""
+        response_cache.backend = RedisBackend("redis://127.0.0.1:1/0", 60)
+        token = self.login_as_admin()
+        res = self.add_book({"isbn": "99921-58-10-7", "title": "Garry Potter", "location": "AC-132"}, token)
+        self.assertEqual(res.status_code, 201)
+        res = self.client().get("/api/v1/books/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(json.loads(res.data)), 1)
+        self.assertIsNone(res.headers.get("ETag"))
+
+    def test_compiled_dumpers_match_schema_dump(self):
+        """Test the precompiled dumpers produce what marshmallow would"""
+        with self.app.app_context():
+            book = BookModel({"isbn": "99921-58-10-7", "title": "Garry Potter", "location": "AC-132"})
+            book.save()
+            admin = UserModel.get_user_by_email("admin@test.com")
+            issue = BookIssueModel({"book_id": book.id, "patron_id": admin.id})
+            issue.save()
+
+            for schema, row in ((BookSchema(), book), (BookIssueSchema(), issue), (UserSchema(), admin)):
+                self.assertEqual(compile_dumper(schema)(row), schema.dump(row))
+
+    def test_list_queries_answer_rows_without_loading_entities(self):
+        """Test list endpoints read only the columns they output"""
+        with self.app.app_context():
+            book = BookModel({"isbn": "99921-58-10-7", "title": "Garry Potter", "location": "AC-132"})
+            book.save()
+            expected = BookSchema().dump(book)
+            db.session.expunge_all()
+
+            rows = BookModel.get_books_page(limit=10)
+            self.assertEqual([compile_dumper(BookSchema())(row) for row in rows], [expected])
+            self.assertEqual(len(db.session.identity_map), 0)
+
+            self.create_user({"name": "Name", "email": "name@mail.com", "password": "!pAsSw0rD!"},
+                             self.login_as_admin())
+            patrons = UserModel.get_users_by_role("Patron", limit=10)
+            self.assertNotIn("password", patrons[0].keys())
+
+    def test_catalog_reads_use_the_replica_until_the_request_writes(self):
+        """Test replica routing and read-your-writes stickiness"""
+        self.app.config["SQLALCHEMY_BINDS"] = {"replica": "sqlite://"}
+        with self.app.app_context():
+            replica = db.get_engine(self.app, bind="replica")
+            db.Model.metadata.create_all(replica)
+            self.assertIs(db.session.get_bind(), db.engine)
+            with BookDao.reading():
+                self.assertIs(db.session.get_bind(), replica)
+
+            BookModel({"isbn": "99921-58-10-7", "title": "Garry Potter", "location": "AC-132"}).save()
+            self.assertEqual(BookDao.get_books_page(limit=10)[0].title, "Garry Potter")
+
+        # A new request reads the (empty) replica again, except for cached
+        # responses which are read from the primary
+        res = self.client().get("/api/v1/books/?stream=true")
+        self.assertEqual(json.loads(res.data), [])
+        res = self.client().get("/api/v1/books/")
+        self.assertEqual(len(json.loads(res.data)), 1)
+
+    def test_pool_records_checkout_waits_overflow_and_timeouts(self):
+        """Test the instrumented pool counts what the metrics endpoint shows"""
+        pool = InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=1, timeout=0.01)
+        first, second = pool.connect(), pool.connect()
+        with self.assertRaises(TimeoutError):
+            pool.connect()
+
+        stats = pool.stats()
+        self.assertEqual((stats["checked_out"], stats["overflow"], stats["timeouts"]), (2, 1, 1))
+        self.assertEqual(sum(stats["wait_ms_histogram"].values()), 2)
+        first.close()
+        second.close()
+
+        res = self.client().get("/internal/metrics/", headers={"Authorization": f"Token {self.login_as_admin()}"})
+        self.assertIn("primary", json.loads(res.data)["database_pools"])
+
+    def test_endpoints_stay_within_their_query_budget(self):
+        """Test list and checkout endpoints run a fixed number of queries"""
+        admin_token = self.login_as_admin()
+        librarian_token = self.login_as_librarian()
+        for index in range(3):
+            self.create_user({"name": f"Patron {index}", "email": f"patron{index}@mail.com", "password": "testpass"},
+                             admin_token)
+            self.add_book({"isbn": f"99921-58-10-{index}", "title": "Garry Potter", "location": "AC-132"},
+                          admin_token)
+        with self.app.app_context():
+            patron_id = UserModel.get_user_by_email("patron0@mail.com").id
+
+        res = self.assertMaxQueries(1, "GET", "/api/v1/books/", librarian_token)
+        self.assertIn("db;dur=", res.headers["Server-Timing"])
+        self.assertMaxQueries(2, "GET", "/api/v1/users/patrons/", librarian_token)
+        for book_id in (1, 2, 3):
+            self.assertMaxQueries(4, "POST", "/api/v1/issues/", librarian_token,
+                                  json.dumps({"book_id": book_id, "patron_id": patron_id}))
+        self.assertMaxQueries(2, "GET", "/api/v1/issues/", librarian_token)
+
     def test_librarian_can_create_an_issue(self):
         """Test librarian can create an issue"""
 
@@ -1,13 +1,25 @@
 # Faili nimi peaks olema book_view (PEP-8)
-# from flask import request, json, Response, Blueprint, g
+from flask import request, json, Response, Blueprint, g, stream_with_context
 from ..models.UserModel import UserModel, UserSchema, Role
 from .UserView import has_role_required
 from ..models.BookModel import BookModel, BookSchema
 from ..models.BookModel import BookIssueModel, BookIssueSchema
+from ..dao.BookDao import BookDao, BookIssueDao
+from ..services.BookService import import_books, read_csv, read_ndjson
+from ..services.BookService import DEFAULT_IMPORT_CHUNK_SIZE, MAX_IMPORT_CHUNK_SIZE
+from ..services.IssueService import MAX_BATCH_SIZE, IssueError, checkout, checkout_many
+from ..services.IssueService import return_issue, return_many
+from ..services.ReportService import OVERDUE_FIELDS, overdue_report
+from ..services.SearchService import MAX_SEARCH_LIMIT
 from ..shared.Authentication import Auth
+from ..shared.Pagination import STREAM_CHUNK_SIZE, get_int_arg, get_page_args, wants_stream
+from ..shared.Pagination import set_next_cursor, stream_csv, stream_ndjson, stream_response
+from ..shared.ResponseCache import response_cache
+from ..shared.Serialization import compile_dumper, dump_many, json_response
 from webargs import flaskparser
 from flask_user import roles_required, UserMixin
 from flask import current_app as app
+import datetime
 import sys
 
 '''
@@ -17,9 +29,12 @@ parser = flaskparser.FlaskParser()
 
 book_api = Blueprint("book_api", __name__)
 book_schema = BookSchema()
+dump_book = compile_dumper(book_schema)
+MAX_AVAILABILITY_ISBNS = 100
 
 issue_api = Blueprint("issue_api", __name__)
 issue_schema = BookIssueSchema()
+dump_issue = compile_dumper(issue_schema)
 
 @book_api.route("/", methods=["POST"])
 @Auth.auth_required
@@ -27,7 +42,7 @@ def create():
     """Add a book"""
 
     if not has_role_required(g, ["Admin"]):
-        return custom_response({"error": "Authorization Required"}, 401)
+        return json_response({"error": "Authorization Required"}, 401)
 
     req_data = request.get_json()
     data = book_schema.load(req_data)
@@ -35,27 +50,100 @@ def create():
     book.save()
     ser_data = book_schema.dump(book)
     app.logger.info(f'Book added "{book.title}" (id={book.id})')
-    return custom_response(data, 201)
+    return json_response(data, 201)
+
+
+@book_api.route("/import", methods=["POST"])
+@Auth.auth_required
+def bulk_import():
+    """Import books from an NDJSON or CSV (Content-Type: text/csv) upload"""
+
+    if not has_role_required(g, ["Admin"]):
+        return json_response({"error": "Authorization Required"}, 401)
+
+    try:
+        chunk_size = max(1, min(get_int_arg("chunk_size", DEFAULT_IMPORT_CHUNK_SIZE), MAX_IMPORT_CHUNK_SIZE))
+    except ValueError as err:
+        return json_response({"error": str(err)}, 400)
+    reader = read_csv if request.mimetype == "text/csv" else read_ndjson
+    result = import_books(reader(request.stream), chunk_size)
+    app.logger.info(f'Books imported ({result["imported"]}, {len(result["errors"])} rejected)')
+    return json_response(result, 201 if result["imported"] else 400)
 
 
 @book_api.route("/", methods=["GET"])
+@response_cache.cached("books")
 def get_all():
-    """Get all books"""
+    """Get a page of books, or stream the whole catalog"""
+
+    if wants_stream():
+        return stream_response(BookDao.iter_books(STREAM_CHUNK_SIZE), dump_book)
+
+    try:
+        after_id, limit = get_page_args()
+    except ValueError as err:
+        return json_response({"error": str(err)}, 400)
+    books = BookDao.get_books_page(after_id, limit)
+    data = dump_many(dump_book, books)
+    return set_next_cursor(json_response(data, 200), books, limit)
+
+
+@book_api.route("/search", methods=["GET"])
+@response_cache.cached("books")
+def search():
+    """Search books by title or ISBN, best matches first"""
+
+    query = request.args.get("q", "").strip()
+    if not query:
+        return json_response({"error": "query parameter q is required"}, 400)
+    try:
+        limit = max(1, min(get_int_arg("limit", 20), MAX_SEARCH_LIMIT))
+        offset = max(0, get_int_arg("offset", 0))
+    except ValueError as err:
+        return json_response({"error": str(err)}, 400)
+
+    books = BookDao.search(query, limit, offset)
+    data = dump_many(dump_book, books)
+    return json_response(data, 200)
 
-    books = BookModel.get_all_books()
-    data = book_schema.dump(books, many=True)
-    return custom_response(data, 200)
+
+@book_api.route("/availability", methods=["GET"])
+def get_availability():
+    """Total copies, available copies and next due date for up to 100 ISBNs
+
+    ISBNs come as repeated isbn parameters or a comma separated isbns list.
+    """
+
+    isbns = request.args.getlist("isbn") + [isbn for isbn in request.args.get("isbns", "").split(",") if isbn]
+    isbns = list(dict.fromkeys(isbn.strip() for isbn in isbns if isbn.strip()))
+    if not isbns:
+        return json_response({"error": "isbn or isbns parameter is required"}, 400)
+    if len(isbns) > MAX_AVAILABILITY_ISBNS:
+        return json_response({"error": f"at most {MAX_AVAILABILITY_ISBNS} ISBNs per request"}, 400)
+
+    availability = BookModel.get_availability(isbns)
+    data = []
+    for isbn in isbns:
+        total, available, next_due = availability[isbn]
+        data.append({
+            "isbn": isbn,
+            "total": total,
+            "available": available,
+            "next_due_date": next_due.isoformat() if next_due else None,
+        })
+    return json_response(data, 200)
 
 
 @book_api.route("/<int:book_id>", methods=["GET"])
+@response_cache.cached("books")
 def get_one(book_id):
     """Get a book"""
 
-    book = BookModel.get_one_book(book_id)
+    book = BookDao.get_readonly(book_id)
     if not book:
-        return custom_response({"error": "book not found"}, 404)
-    data = book_schema.dump(book)
-    return custom_response(data, 200)
+        return json_response({"error": "book not found"}, 404)
+    data = dump_book(book)
+    return json_response(data, 200)
 
 
 @book_api.route("/<int:book_id>", methods=["DELETE"])
@@ -64,16 +152,16 @@ def delete(book_id):
     """Delete a book"""
 
     if not has_role_required(g, ["Admin"]):
-        return custom_response({"error": "Authorization Required"}, 401)
+        return json_response({"error": "Authorization Required"}, 401)
 
     book = BookModel.get_one_book(book_id)
     if not book:
-        return custom_response({"error": "book not found"}, 404)
+        return json_response({"error": "book not found"}, 404)
     if not BookIssueModel.is_book_issued(book_id):
         book.delete()
         app.logger.info('Book deleted "{book.title}" (id={book.id})')
-        return custom_response({"message": "deleted"}, 204)
-    return custom_response({"error": "Cannot delete an issued book"}, 400)
+        return json_response({"message": "deleted"}, 204)
+    return json_response({"error": "Cannot delete an issued book"}, 400)
 
 @issue_api.route("/", methods=["POST"])
 @Auth.auth_required
@@ -81,53 +169,144 @@ def create_new_issue():
     """Create an issue"""
 
     if not has_role_required(g, ["Librarian"]):
-        return custom_response({"error": "Authorization Required"}, 401)
+        return json_response({"error": "Authorization Required"}, 401)
 
     req_data = request.get_json()
     data  = issue_schema.load(req_data)
 
-    book = BookModel.get_one_book(data['book_id'])
-    user = UserModel.get_one_user(data['patron_id'])
-    if not book:
-        return custom_response({"error": "book not found"}, 404)
-    if not user:
-        return custom_response({"error": "user not found"}, 404)
+    try:
+        checkout(data['book_id'], data['patron_id'])
+    except IssueError as err:
+        return json_response({"error": err.message}, err.status_code)
+    return json_response(data, 201)
+
+@issue_api.route("/batch", methods=["POST"])
+@Auth.auth_required
+def create_issues_batch():
+    """Create several issues at once"""
+
+    if not has_role_required(g, ["Librarian"]):
+        return json_response({"error": "Authorization Required"}, 401)
 
-    if BookIssueModel.is_book_issued(data['book_id']):
-        return custom_response({"error": "The book is already issued"}, 400)
+    items = (request.get_json() or {}).get("items")
+    if not isinstance(items, list) or not items:
+        return json_response({"error": "items must be a non-empty list"}, 400)
+    if len(items) > MAX_BATCH_SIZE:
+        return json_response({"error": f"at most {MAX_BATCH_SIZE} items per batch"}, 400)
+
+    return json_response({"results": checkout_many(items)}, 200)
+
+
+@issue_api.route("/batch/return", methods=["POST"])
+@Auth.auth_required
+def return_issues_batch():
+    """Return several issued books at once"""
+
+    if not has_role_required(g, ["Librarian"]):
+        return json_response({"error": "Authorization Required"}, 401)
+
+    book_ids = (request.get_json() or {}).get("book_ids")
+    # bool is an int subclass, so true/false would pass an isinstance check
+    if not isinstance(book_ids, list) or not book_ids \
+            or not all(type(book_id) is int for book_id in book_ids):
+        return json_response({"error": "book_ids must be a non-empty list of ids"}, 400)
+    book_ids = list(dict.fromkeys(book_ids))
+    if len(book_ids) > MAX_BATCH_SIZE:
+        return json_response({"error": f"at most {MAX_BATCH_SIZE} books per batch"}, 400)
+
+    return json_response({"results": return_many(book_ids)}, 200)
 
-    issue = BookIssueModel(data)
-    issue.save()
-    ser_data = issue_schema.dump(issue)
-    app.logger.info(f'Issue created, book "{book.title}" (id={book.id}) to {user.name} (id={user.id})')
-    return custom_response(data, 201)
 
 @issue_api.route("/", methods=["GET"])
 @Auth.auth_required
 def get_all_active_issues():
-    """Get all issues"""
+    """Get a page of issues, the active ones unless active=false or active=all
+
+    Filters: patron_id, book_id, due_after, due_before (ISO 8601). With
+    embed=book,patron each issue carries a summary of its book and patron.
+    """
 
     if not has_role_required(g, ["Librarian"]):
-        return custom_response({"error": "Authorization Required"}, 401)
+        return json_response({"error": "Authorization Required"}, 401)
+
+    active = request.args.get("active", "true").lower()
+    if active not in ("true", "false", "all"):
+        return json_response({"error": "active must be true, false or all"}, 400)
+    try:
+        due_after, due_before = (
+            datetime.datetime.fromisoformat(request.args[name]) if request.args.get(name) else None
+            for name in ("due_after", "due_before")
+        )
+    except ValueError:
+        return json_response({"error": "due_after and due_before must be ISO 8601 dates"}, 400)
+    try:
+        patron_id, book_id = get_int_arg("patron_id"), get_int_arg("book_id")
+    except ValueError as err:
+        return json_response({"error": str(err)}, 400)
+    embed = set(request.args.get("embed", "").split(",")) & {"book", "patron"}
 
-    issues = BookIssueModel.get_all_issues()
-    data = issue_schema.dump(issues, many=True)
-    return custom_response(data, 200)
+    try:
+        after_id, limit = get_page_args()
+    except ValueError as err:
+        return json_response({"error": str(err)}, 400)
+    issues = BookIssueDao.get_issues_page(
+        after_id, limit,
+        is_active=None if active == "all" else active == "true",
+        patron_id=patron_id,
+        book_id=book_id,
+        due_after=due_after,
+        due_before=due_before,
+        embed=embed,
+    )
+    data = [dump_issue_row(issue, embed) for issue in issues]
+    return set_next_cursor(json_response(data, 200), issues, limit)
+
+
+def dump_issue_row(row, embed):
+    data = dump_issue(row)
+    if "book" in embed:
+        data["book"] = {"id": row.book_id, "isbn": row.book_isbn, "title": row.book_title}
+    if "patron" in embed:
+        data["patron"] = {"id": row.patron_id, "name": row.patron_name, "email": row.patron_email}
+    return data
+
+
+@issue_api.route("/overdue", methods=["GET"])
+@Auth.auth_required
+def get_overdue_report():
+    """Stream the overdue issues as CSV (format=csv) or NDJSON"""
+
+    if not has_role_required(g, ["Librarian"]):
+        return json_response({"error": "Authorization Required"}, 401)
+
+    as_of = request.args.get("as_of")
+    if as_of:
+        try:
+            as_of = datetime.datetime.fromisoformat(as_of)
+        except ValueError:
+            return json_response({"error": "as_of must be an ISO 8601 date"}, 400)
+
+    rows = overdue_report(as_of)
+    if request.args.get("format") == "csv":
+        response = Response(stream_with_context(stream_csv(rows, OVERDUE_FIELDS)), mimetype="text/csv")
+        response.headers["Content-Disposition"] = "attachment; filename=overdue.csv"
+        return response
+    return Response(stream_with_context(stream_ndjson(rows)), mimetype="application/x-ndjson")
 
 
 @issue_api.route('/<int:issue_id>', methods=['PUT'])
 @Auth.auth_required
 def deactivate_issue(issue_id):
     """Deactivate an Issue"""
-    # Not yet implemented
-    pass
 
-def custom_response(res, status_code):
-    """Custom Response Function"""
+    if not has_role_required(g, ["Librarian"]):
+        return json_response({"error": "Authorization Required"}, 401)
 
-    return Response(
-        mimetype="application/json", response=json.dumps(res), status=status_code
-    )
+    try:
+        issue = return_issue(issue_id)
+    except IssueError as err:
+        return json_response({"error": err.message}, err.status_code)
+    return json_response({"id": issue.id, "book_id": issue.book_id, "is_active": False}, 200)
 
 @parser.error_handler
 def handle_request_parsing_error(err, req, schema):
@@ -0,0 +1,29 @@
+from flask import Blueprint, g
+from flask import current_app as app
+from .UserView import has_role_required
+from ..models import db
+from ..shared.Authentication import Auth
+from ..shared.Hashing import password_hasher
+from ..shared.PoolMetrics import pool_stats
+from ..shared.QueryMetrics import query_metrics
+from ..shared.Serialization import json_response
+
+
+metrics_api = Blueprint("metrics_api", __name__)
+
+
+@metrics_api.route("/", methods=["GET"])
+@Auth.auth_required
+def get_metrics():
+    """Internal runtime metrics"""
+
+    if not has_role_required(g, ["Admin"]):
+        return json_response({"error": "Authorization Required"}, 401)
+
+    binds = [None] + list(app.config.get("SQLALCHEMY_BINDS") or ())
+    database_pools = {bind or "primary": pool_stats(db.get_engine(app, bind).pool) for bind in binds}
+    return json_response({
+        "password_hashing": password_hasher.stats(),
+        "database_pools": database_pools,
+        "queries": query_metrics.stats(),
+    }, 200)
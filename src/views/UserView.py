@@ -1,6 +1,13 @@
 from flask import request, json, Response, Blueprint, g
 from ..models.UserModel import UserModel, UserSchema, Role
+from ..dao.BookDao import BookIssueDao
+from ..dao.UserDao import UserDao
+from ..models.BookModel import BookIssueSchema
 from ..shared.Authentication import Auth
+from ..shared.Hashing import HashingBusy
+from ..shared.Identity import Identity
+from ..shared.Pagination import get_page_args, set_next_cursor
+from ..shared.Serialization import compile_dumper, dump_many, json_response
 from webargs import flaskparser
 from flask_user import roles_required, UserMixin
 import sys
@@ -16,15 +23,23 @@ parser = flaskparser.FlaskParser()
 
 user_api = Blueprint("user_api", __name__)
 user_schema = UserSchema()
+dump_user = compile_dumper(user_schema)
+dump_issue = compile_dumper(BookIssueSchema())
+
+@user_api.errorhandler(HashingBusy)
+def handle_hashing_busy(err):
+    """Shed load when the password hashing queue is full"""
+
+    response = json_response({"error": "Server busy, please try again"}, 503)
+    response.headers["Retry-After"] = "1"
+    return response
+
 
 def has_role_required(g, required_roles):
     """Check if user has role required"""
 
-    for role in required_roles:
-        for user_role in UserModel.query.get(g.user.get("id")).roles:
-            if role == user_role.name:
-                return True
-    return False
+    identity = g.get("identity") or Identity.load(g.user.get("id"))
+    return identity is not None and identity.has_any_role(required_roles)
 
 
 @user_api.route("/patrons/", methods=["POST"])
@@ -33,7 +48,7 @@ def create_patron():
     """Create Patron Function"""
 
     if not has_role_required(g, ["Admin", "Librarian"]):
-        return custom_response({"error": "Authorization Required"}, 401)
+        return json_response({"error": "Authorization Required"}, 401)
 
     req_data = request.get_json()
     data = user_schema.load(req_data)
@@ -44,15 +59,15 @@ def create_patron():
             "error": "User already exist, please supply another \
         email address"
         }
-        return custom_response(message, 400)
+        return json_response(message, 400)
 
     user = UserModel(data)
     user.roles = [Role.query.filter_by(name="Patron").first()]
     user.save()
     ser_data = user_schema.dump(user)
-    token = Auth.generate_token(ser_data.get("id"))
+    token = Auth.generate_token(ser_data.get("id"), [role.name for role in user.roles], user.token_version)
     app.logger.info(f'Patron created ({user.name})')
-    return custom_response({"jwt_token": token}, 201)
+    return json_response({"jwt_token": token}, 201)
 
 
 @user_api.route("/patrons/", methods=["GET"])
@@ -61,18 +76,18 @@ def get_all_patrons():
     """Get all patrons"""
 
     if not has_role_required(g, ["Admin", "Librarian"]):
-        return custom_response({"error": "Authorization Required"}, 401)
+        return json_response({"error": "Authorization Required"}, 401)
 
     query = request.args.get("query")
-    users = {}
+    try:
+        after_id, limit = get_page_args()
+    except ValueError as err:
+        return json_response({"error": str(err)}, 400)
 
-    if query:
-        users = UserModel.get_users_by_role_and_query("Patron", query)
-    else:
-        users = UserModel.get_users_by_role("Patron")
+    users = UserDao.get_users_page("Patron", query, after_id, limit)
 
-    ser_users = user_schema.dump(users, many=True)
-    return custom_response(ser_users, 200)
+    ser_users = dump_many(dump_user, users)
+    return set_next_cursor(json_response(ser_users, 200), users, limit)
 
 
 @user_api.route("/patrons/<int:user_id>", methods=["GET"])
@@ -81,14 +96,58 @@ def get_a_patron(user_id):
     """Get a single patron"""
 
     if not has_role_required(g, ["Admin", "Librarian"]):
-        return custom_response({"error": "Authorization Required"}, 401)
+        return json_response({"error": "Authorization Required"}, 401)
 
-    user = UserModel.get_one_user(user_id)
+    user = UserDao.get_readonly(user_id)
     if not user:
-        return custom_response({"error": "user not found"}, 404)
+        return json_response({"error": "user not found"}, 404)
+
+    ser_user = dump_user(user)
+    return json_response(ser_user, 200)
+
+
+@user_api.route("/patrons/<int:user_id>/issues", methods=["GET"])
+@Auth.auth_required
+def get_patron_issues(user_id):
+    """Get a patron's loan counters and a page of their issues
+
+    Lists the active issues unless active=false or active=all. Patrons may
+    see their own loans.
+    """
 
-    ser_user = user_schema.dump(user)
-    return custom_response(ser_user, 200)
+    if g.user.get("id") != user_id and not has_role_required(g, ["Admin", "Librarian"]):
+        return json_response({"error": "Authorization Required"}, 401)
+
+    active = request.args.get("active", "true").lower()
+    if active not in ("true", "false", "all"):
+        return json_response({"error": "active must be true, false or all"}, 400)
+
+    user = UserDao.get_readonly(user_id)
+    if not user:
+        return json_response({"error": "user not found"}, 404)
+
+    try:
+        after_id, limit = get_page_args()
+    except ValueError as err:
+        return json_response({"error": str(err)}, 400)
+    issues = BookIssueDao.get_issues_page(
+        after_id, limit, is_active=None if active == "all" else active == "true",
+        patron_id=user_id, embed={"book"},
+    )
+    data = {
+        "patron": {"id": user.id, "name": user.name},
+        "loans": {
+            "active": user.active_loans,
+            "total": user.total_loans,
+            "overdue": user.overdue_loans,
+            "overdue_counted_at": user.overdue_counted_at.isoformat() if user.overdue_counted_at else None,
+        },
+        "issues": [
+            dict(dump_issue(issue), book={"id": issue.book_id, "isbn": issue.book_isbn, "title": issue.book_title})
+            for issue in issues
+        ],
+    }
+    return set_next_cursor(json_response(data, 200), issues, limit)
 
 
 @user_api.route("/login/", methods=["POST"])
@@ -100,7 +159,7 @@ def login():
     data = user_schema.load(req_data, partial=True)
 
     if not data.get("email") or not data.get("password"):
-        return custom_response(
+        return json_response(
             {
                 "error": "you need email and password \
         to sign in"
@@ -109,20 +168,17 @@ def login():
         )
     user = UserModel.get_user_by_email(data.get("email"))
     if not user:
-        return custom_response({"error": "invalid credentials"}, 400)
+        return json_response({"error": "invalid credentials"}, 400)
     if not user.check_hash(data.get("password")):
-        return custom_response({"error": "invalid credentials"}, 400)
+        return json_response({"error": "invalid credentials"}, 400)
+    try:
+        if user.rehash_if_needed(data.get("password")):
+            app.logger.info(f'Password rehashed with the configured cost (id={user.id})')
+    except HashingBusy:
+        pass
     ser_data = user_schema.dump(user)
-    token = Auth.generate_token(ser_data.get("id"))
-    return custom_response({"jwt_token": token}, 200)
-
-
-def custom_response(res, status_code):
-    """Custom Response Function"""
-
-    return Response(
-        mimetype="application/json", response=json.dumps(res), status=status_code
-    )
+    token = Auth.generate_token(ser_data.get("id"), [role.name for role in user.roles], user.token_version)
+    return json_response({"jwt_token": token}, 200)
 
 
 @parser.error_handler